@@ -0,0 +1,111 @@
+"""
+Compare the streaming decrypt pipeline with the old download -> decrypt -> write flow.
+
+Each mode runs in a fresh interpreter so peak RSS is measured in isolation.
+The CDN is replaced by an in-process transport that streams a random
+payload from disk, so the numbers only reflect our side of the pipeline.
+
+    python -m benchmarks.decrypt_pipeline --size-mb 64 --runs 3
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+# `src` builds the Telegram client on import, which insists on these.
+os.environ.setdefault("API_ID", "1")
+os.environ.setdefault("API_HASH", "benchmark")
+os.environ.setdefault("TOKEN", "1:benchmark")
+
+TRACK_KEY = "00112233445566778899aabbccddeeff"
+READ_SIZE = 64 * 1024
+
+
+def _make_payload(path: Path, size_mb: int) -> None:
+    with path.open("wb") as f:
+        for _ in range(size_mb):
+            f.write(os.urandom(1024 * 1024))
+
+
+async def _run_once(payload: Path, work_dir: Path, streaming: bool) -> float:
+    import httpx
+    from src import config
+    from src.utils._http import HttpClient
+    from src.utils._dataclass import TrackInfo
+    from src.utils._downloader import Download
+
+    async def body():
+        with payload.open("rb") as f:
+            while chunk := f.read(READ_SIZE):
+                yield chunk
+
+    def handler(_: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=body())
+
+    client = HttpClient._clients["cdn"] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    config.STREAM_DECRYPT = streaming
+    config.DOWNLOAD_PATH = str(work_dir)
+
+    track = TrackInfo(
+        cdnurl="https://cdn.invalid/audio", key=TRACK_KEY, name="benchmark", artist="", tc="bench",
+        cover="", lyrics="", album="", year=0, duration=0, platform="spotify",
+    )
+    dl = Download(track)
+    encrypted = work_dir / f"{uuid.uuid4()}.enc"
+    decrypted = work_dir / f"{uuid.uuid4()}.tmp"
+
+    start = time.perf_counter()
+    try:
+        await dl.download_and_decrypt(encrypted, decrypted)
+        return time.perf_counter() - start
+    finally:
+        encrypted.unlink(missing_ok=True)
+        decrypted.unlink(missing_ok=True)
+        await client.aclose()
+
+
+def _child(payload: Path, mode: str) -> None:
+    with tempfile.TemporaryDirectory() as work_dir:
+        elapsed = asyncio.run(_run_once(payload, Path(work_dir), mode == "stream"))
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{elapsed:.4f} {peak_kb}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", choices=["stream", "legacy"], help=argparse.SUPPRESS)
+    parser.add_argument("--payload", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.payload, args.child)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        payload = Path(tmp) / "payload.enc"
+        _make_payload(payload, args.size_mb)
+
+        print(f"payload: {args.size_mb} MiB, runs: {args.runs}")
+        print(f"{'mode':<8} {'best wall (s)':>14} {'peak RSS (MiB)':>15}")
+        for mode in ("legacy", "stream"):
+            walls, peaks = [], []
+            for _ in range(args.runs):
+                out = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.decrypt_pipeline", "--child", mode, "--payload", str(payload)],
+                    check=True, capture_output=True, text=True,
+                ).stdout.split()
+                walls.append(float(out[-2]))
+                peaks.append(int(out[-1]) / 1024)
+            print(f"{mode:<8} {min(walls):>14.3f} {max(peaks):>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Compare API response decoding: `response.json()` + `Model(**item)` per track
+against validating the raw body bytes with pydantic in one call.
+
+Also reports the retained size of one parsed track, which is what the
+response cache holds on to.
+
+    python -m benchmarks.parse_tracks --tracks 50 --runs 2000
+"""
+import argparse
+import gc
+import json
+import os
+import time
+import tracemalloc
+from typing import Callable, List
+
+from pydantic import BaseModel
+
+# `src` builds the Telegram client on import, which insists on these.
+os.environ.setdefault("API_ID", "1")
+os.environ.setdefault("API_HASH", "benchmark")
+os.environ.setdefault("TOKEN", "1:benchmark")
+
+from src.utils._dataclass import PlatformTracks, TrackInfoAdapter  # noqa: E402
+
+RETAINED_SAMPLE = 10_000
+
+
+class LegacyMusicTrack(BaseModel):
+    name: str
+    artist: str
+    id: str
+    url: str
+    year: str
+    cover: str
+    cover_small: str
+    duration: int
+    platform: str
+
+
+class LegacyPlatformTracks(BaseModel):
+    results: List[LegacyMusicTrack]
+
+
+class LegacyTrackInfo(BaseModel):
+    cdnurl: str
+    key: str
+    name: str
+    artist: str
+    tc: str
+    cover: str
+    lyrics: str
+    album: str
+    year: int
+    duration: int
+    platform: str
+
+
+def _search_body(tracks: int) -> bytes:
+    return json.dumps({"results": [
+        {
+            "name": f"Track {i}", "artist": "Artist", "id": f"{i:022d}",
+            "url": f"https://open.spotify.com/track/{i:022d}", "year": "2024",
+            "cover": "https://i.scdn.co/image/large", "cover_small": "https://i.scdn.co/image/small",
+            "duration": 215, "platform": "spotify",
+        }
+        for i in range(tracks)
+    ]}).encode()
+
+
+def _track_body() -> bytes:
+    return json.dumps({
+        "cdnurl": "https://audio.cdn.invalid/" + "a" * 200, "key": "00" * 16, "name": "Track", "artist": "Artist",
+        "tc": "a" * 22, "cover": "https://i.scdn.co/image/large", "lyrics": "", "album": "Album",
+        "year": 2024, "duration": 215, "platform": "spotify",
+    }).encode()
+
+
+def _legacy_search(body: bytes):
+    raw = json.loads(body)
+    return LegacyPlatformTracks(results=[LegacyMusicTrack(**track) for track in raw.get("results", [])])
+
+
+def _legacy_track(body: bytes):
+    return LegacyTrackInfo(**json.loads(body))
+
+
+def _time_per_call(parse: Callable[[bytes], object], body: bytes, runs: int) -> float:
+    parse(body)
+    start = time.perf_counter()
+    for _ in range(runs):
+        parse(body)
+    return (time.perf_counter() - start) / runs
+
+
+def _retained_per_track(parse: Callable[[bytes], object], body: bytes, tracks: int) -> float:
+    copies = max(RETAINED_SAMPLE // tracks, 1)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [parse(body) for _ in range(copies)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / (copies * tracks)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tracks", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=2000)
+    args = parser.parse_args()
+
+    search_body, track_body = _search_body(args.tracks), _track_body()
+    cases = [
+        ("search", search_body, args.tracks, _legacy_search, PlatformTracks.model_validate_json),
+        ("get_track", track_body, 1, _legacy_track, TrackInfoAdapter.validate_json),
+    ]
+
+    print(f"search response: {args.tracks} tracks, {len(search_body)} bytes; runs: {args.runs}")
+    print(f"{'response':<10} {'path':<7} {'parse (us)':>11} {'bytes/track':>12}")
+    for name, body, tracks, legacy, current in cases:
+        for label, parse in (("legacy", legacy), ("bytes", current)):
+            per_call = _time_per_call(parse, body, args.runs) * 1e6
+            retained = _retained_per_track(parse, body, tracks)
+            print(f"{name:<10} {label:<7} {per_call:>11.1f} {retained:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ from datetime import datetime
 from pytdbot import Client, types
 
 from src import config
-from src.utils import HttpClient
+from src.utils import HttpClient, disk_cache, upload_cache
 
 logging.basicConfig(
     level=logging.INFO,
@@ -38,12 +38,15 @@ class Telegram(Client):
         self._http_client = HttpClient()
 
     async def start(self) -> None:
-        await self._http_client.get_client()
+        await self._http_client.get_client("api")
+        await disk_cache.start()
         await super().start()
         self.logger.info(f"Bot started in {datetime.now() - StartTime} seconds.")
 
     async def stop(self) -> None:
         await self._http_client.close_client()
+        await disk_cache.stop()
+        upload_cache.close()
         await super().stop()
 
 
@@ -14,6 +14,13 @@ def get_env_int(name: str, default: Optional[int] = None) -> Optional[int]:
         return default
 
 
+def get_env_bool(name: str, default: bool = False) -> bool:
+    value = getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 API_ID: Optional[int] = get_env_int("API_ID")
 API_HASH: Optional[str] = getenv("API_HASH")
 TOKEN: Optional[str] = getenv("TOKEN")
@@ -21,3 +28,17 @@ API_KEY = getenv("API_KEY")
 API_URL = getenv("API_URL")
 DOWNLOAD_PATH = getenv("DOWNLOAD_PATH", "database")
 LOGGER_ID = get_env_int("LOGGER_ID", -1002434755494)
+STREAM_DECRYPT = get_env_bool("STREAM_DECRYPT", True)
+CACHE_MAX_SIZE_MB = get_env_int("CACHE_MAX_SIZE_MB", 5120)
+CACHE_MAX_AGE_HOURS = get_env_int("CACHE_MAX_AGE_HOURS", 168)
+UPLOAD_CACHE_PATH = getenv("UPLOAD_CACHE_PATH", f"{DOWNLOAD_PATH}/upload_cache.db")
+UPLOAD_CACHE_TTL_HOURS = get_env_int("UPLOAD_CACHE_TTL_HOURS", 720)
+DOWNLOAD_SLOTS = get_env_int("DOWNLOAD_SLOTS", 3)
+SEGMENTED_DOWNLOADS = get_env_int("SEGMENTED_DOWNLOADS", 4)
+API_HTTP2 = get_env_bool("API_HTTP2", False)
+API_HEDGING = get_env_bool("API_HEDGING", False)
+HEDGE_PERCENTILE = get_env_int("HEDGE_PERCENTILE", 95)
+HEDGE_BUDGET_PERCENT = get_env_int("HEDGE_BUDGET_PERCENT", 5)
+PREFETCH_RESULTS = get_env_int("PREFETCH_RESULTS", 1)
+PREFETCH_BUDGET_SECONDS = get_env_int("PREFETCH_BUDGET_SECONDS", 15)
+PROBE_CONCURRENCY = get_env_int("PROBE_CONCURRENCY", 4)
@@ -1,7 +1,10 @@
+import html
 import re
+from typing import Optional, Union
+
 from pytdbot import Client, types
 
-from src.utils import ApiData, Download, shortener
+from src.utils import ApiData, Download, format_html, prefetcher, shortener, upload_cache
 
 
 @Client.on_updateNewCallbackQuery()
@@ -44,22 +47,56 @@ async def callback_query(c: Client, message: types.UpdateNewCallbackQuery):
         await message.answer("⚠️ This button has expired. Please try again.", show_alert=True)
         return
 
+    prefetcher.claim((message.chat_id, message.message_id), url)
+
+    # Fast path: this track was sent before, so no API or CDN call is needed.
+    url_key = upload_cache.url_key(url)
+    cached = upload_cache.get_with_meta(url_key)
+    # A callback query can only be answered once.
+    answered = False
+    if cached:
+        file_id, meta = cached
+        await message.answer("⏳ Sending your track...")
+        answered = True
+        reply = await _edit_with_audio(c, message, meta, types.InputFileRemote(file_id), None)
+        if not isinstance(reply, types.Error):
+            return
+        c.logger.warning(f"❌ Cached file_id rejected, resolving track again: {reply.message}")
+        upload_cache.delete(url_key)
+
     api = ApiData(url)
     track = await api.get_track()
     if isinstance(track, types.Error):
-        await message.answer(f"❌ Failed to fetch track info.\n<b>{track.message}</b>", show_alert=True)
+        error_text = f"❌ Failed to fetch track info.\n<b>{html.escape(track.message)}</b>"
+        if answered:
+            await _edit_text(c, message.chat_id, message.message_id, error_text)
+        else:
+            # Callback answers are plain text.
+            await message.answer(format_html(error_text).text, show_alert=True)
         return
 
-    await message.answer("⏳ Processing your track, please wait...", show_alert=True)
-    msg = await message.edit_message_text("🔄 Downloading the song...")
+    if not answered:
+        await message.answer("⏳ Processing your track, please wait...", show_alert=True)
+    msg = await _edit_text(c, message.chat_id, message.message_id, "🔄 Downloading the song...")
     if isinstance(msg, types.Error):
         c.logger.warning(f"❌ Failed to edit message: {msg.message}")
         return
 
+    cache_key = upload_cache.track_key(track.platform, track.tc)
+    meta = upload_cache.track_meta(track)
+    cached_file_id = upload_cache.get(cache_key)
+    if cached_file_id:
+        reply = await _edit_with_audio(c, message, meta, types.InputFileRemote(cached_file_id), None)
+        if not isinstance(reply, types.Error):
+            upload_cache.set(url_key, cached_file_id, meta)
+            return
+        c.logger.warning(f"❌ Cached file_id rejected, uploading again: {reply.message}")
+        upload_cache.delete(cache_key)
+
     dl = Download(track)
     result = await dl.process()
     if isinstance(result, types.Error):
-        await msg.edit_text(f"❌ Download failed.\n<b>{result.message}</b>")
+        await _edit_text(c, msg.chat_id, msg.id, f"❌ Download failed.\n<b>{html.escape(result.message)}</b>")
         return
 
     audio_file, cover = result
@@ -84,36 +121,64 @@ async def callback_query(c: Client, message: types.UpdateNewCallbackQuery):
 
         audio_file = file.path
 
-    status_text = f"<b>🎵 {track.name}</b>\n👤 {track.artist} | 📀 {track.album}\n⏱️ {track.duration}s"
-    parse = await c.parseTextEntities(status_text, types.TextParseModeHTML())
+    reply = await _edit_with_audio(c, message, meta, types.InputFileLocal(audio_file), cover)
+    if isinstance(reply, types.Error):
+        c.logger.error(f"❌ Failed to send audio file: {reply.message}")
+        await _edit_text(c, msg.chat_id, msg.id, "❌ Failed to send the song. Please try again later.")
+        return
+
+    if isinstance(reply.content, types.MessageAudio):
+        file_id = reply.content.audio.audio.remote.id
+        upload_cache.set(cache_key, file_id)
+        upload_cache.set(url_key, file_id, meta)
+
+
+async def _edit_text(c: Client, chat_id: int, message_id: int, text: str) -> Union[types.Message, types.Error]:
+    """Edit a message to Telegram-style HTML `text`, parsed locally like every other status message."""
+    return await c.editMessageText(
+        chat_id=chat_id,
+        message_id=message_id,
+        input_message_content=types.InputMessageText(format_html(text)),
+    )
+
+
+async def _edit_with_audio(
+    c: Client,
+    message: types.UpdateNewCallbackQuery,
+    meta: dict,
+    audio: types.InputFile,
+    cover: Optional[str],
+) -> Union[types.Message, types.Error]:
+    name, artist = meta.get("name", ""), meta.get("artist", "")
+    status_text = (
+        f"<b>🎵 {html.escape(name)}</b>\n👤 {html.escape(artist)} | "
+        f"📀 {html.escape(meta.get('album', ''))}\n⏱️ {meta.get('duration', 0)}s"
+    )
+    caption = format_html(status_text)
     reply_markup = types.ReplyMarkupInlineKeyboard(
         [
             [
                 types.InlineKeyboardButton(
-                    text=f"{track.name[:20] + '...' if len(track.name) > 20 else track.name}",
+                    text=f"{name[:20] + '...' if len(name) > 20 else name}",
                     type=types.InlineKeyboardButtonTypeUrl("https://t.me/FallenProjects"),
                 ),
             ],
         ]
     )
-    reply = await c.editMessageMedia(
+    return await c.editMessageMedia(
         chat_id=message.chat_id,
         message_id=message.message_id,
         input_message_content=types.InputMessageAudio(
-            audio=types.InputFileLocal(audio_file),
+            audio=audio,
             album_cover_thumbnail=types.InputThumbnail(types.InputFileLocal(cover)) if cover else None,
-            title=track.name,
-            performer=track.artist,
-            duration=track.duration,
-            caption=parse,
+            title=name,
+            performer=artist,
+            duration=meta.get("duration", 0),
+            caption=caption,
         ),
         reply_markup=reply_markup,
     )
 
-    if isinstance(reply, types.Error):
-        c.logger.error(f"❌ Failed to send audio file: {reply.message}")
-        await msg.edit_text("❌ Failed to send the song. Please try again later.")
-
 async def handle_help_callback(_: Client, message: types.UpdateNewCallbackQuery):
     data = message.payload.data.decode()
     platform = data.replace("help_", "")
@@ -1,11 +1,26 @@
+import asyncio
+import html
 import re
 import uuid
-from typing import Union
+from typing import List, Union
 
 from pytdbot import Client, types
 
 from src import config
-from src.utils import ApiData, Download, upload_cache, shortener, APIResponse
+from src.utils import ApiData, Download, upload_cache, shortener, APIResponse, format_html, inline_sessions
+from src.utils._dataclass import MusicTrack, PlatformTracks
+
+
+# The full result list is fetched once (and cached); Telegram asks for later
+# pages with `offset`. The first page is kept small so it reaches the user
+# quickly; results are formatted locally, so page size costs no TDLib calls.
+INLINE_SEARCH_LIMIT = "15"
+FIRST_PAGE_SIZE = 5
+PAGE_SIZE = 10
+INLINE_CACHE_TIME = 300
+ERROR_CACHE_TIME = 5
+# How long a search may take before an earlier query's filtered results are shown instead.
+PREFIX_ANSWER_WAIT = 0.3
 
 
 @Client.on_updateNewInlineQuery()
@@ -13,70 +28,129 @@ async def inline_search(c: Client, message: types.UpdateNewInlineQuery):
     query = message.query.strip()
     if not query:
         return None
+    # One query per user at a time: the next keystroke cancels this one.
+    inline_sessions.submit(message.sender_user_id, _answer_inline(c, message, query))
+    return None
+
+
+async def _answer_inline(c: Client, message: types.UpdateNewInlineQuery, query: str) -> None:
     api = ApiData(query)
     if api.is_save_snap_url():
         return await process_snap_inline(c, message, query)
 
-    search = await api.get_info() if api.is_valid() else await api.search(limit="15")
+    # Stale results are fine here: they are answered now and refreshed behind the scenes.
+    if api.is_valid():
+        search = await api.get_info(stale_ok=True)
+    else:
+        search = await _search_or_filter_prefix(c, message, api, query)
+        if search is None:
+            return None
+
     if isinstance(search, types.Error):
         await c.answerInlineQuery(
-            message.id,
+            inline_query_id=message.id,
             results=[
                 types.InputInlineQueryResultArticle(
                     id="error",
                     title="❌ Search Failed",
                     description=search.message or "Could not search Spotify.",
                 )
-            ]
+            ],
+            cache_time=ERROR_CACHE_TIME,
         )
         return None
 
-    results = []
-    for track in search.results:
-        display_text = (
-            f"<b>🎧 Track:</b> <b>{track.name}</b>\n"
-            f"<b>👤 Artist:</b> <i>{track.artist}</i>\n"
-            f"<b>📅 Year:</b> {track.year}\n"
-            f"<b>⏱ Duration:</b> {track.duration // 60}:{track.duration % 60:02d} mins\n"
-            f"<b>🔗 Platform:</b> {track.platform.capitalize()}\n"
-            f"<code>{track.id}</code>"
-        )
+    offset = int(message.offset) if message.offset.isdigit() else 0
+    await _answer_tracks(c, message, search.results, offset, INLINE_CACHE_TIME)
+    return None
 
-        parse = await c.parseTextEntities(display_text, types.TextParseModeHTML())
-        if isinstance(parse, types.Error):
-            c.logger.warning(f"❌ Error parsing inline result for {track.name}: {parse.message}")
-            continue
 
-        reply_markup = types.ReplyMarkupInlineKeyboard(
-            [
-                [
-                    types.InlineKeyboardButton(
-                        text=f"{track.name}",
-                        type=types.InlineKeyboardButtonTypeSwitchInline(query=track.artist, target_chat=types.TargetChatCurrent())
-                    ),
-                ],
-            ]
-        )
-
-        results.append(
-            types.InputInlineQueryResultArticle(
-                id=shortener.encode_url(track.url),
-                title=f"{track.name} - {track.artist}",
-                description=f"{track.name} by {track.artist} ({track.year})",
-                thumbnail_url=track.cover_small,
-                input_message_content=types.InputMessageText(parse),
-                reply_markup=reply_markup,
-            )
-        )
+async def _search_or_filter_prefix(
+    c: Client, message: types.UpdateNewInlineQuery, api: ApiData, query: str
+) -> Union[PlatformTracks, types.Error, None]:
+    """
+    Search, answering from the results of an earlier, shorter query if the search is slow.
+
+    Returns None when the query was already answered from those results.
+    """
+    user_id = message.sender_user_id
+    request = asyncio.ensure_future(api.search(limit=INLINE_SEARCH_LIMIT, stale_ok=True))
+    try:
+        local = inline_sessions.prefix_matches(user_id, query) if not message.offset else None
+        if local:
+            done, _ = await asyncio.wait({request}, timeout=PREFIX_ANSWER_WAIT)
+            if not done:
+                # Personal and uncached: it is a filtered guess, not the real answer for this query.
+                await _answer_tracks(c, message, local, 0, 0, is_personal=True, paginate=False)
+                search = await request
+                if not isinstance(search, types.Error):
+                    inline_sessions.remember(user_id, query, search.results)
+                return None
+
+        search = await request
+    finally:
+        request.cancel()
+
+    if not isinstance(search, types.Error):
+        inline_sessions.remember(user_id, query, search.results)
+    return search
+
+
+async def _answer_tracks(
+    c: Client,
+    message: types.UpdateNewInlineQuery,
+    tracks: List[MusicTrack],
+    offset: int,
+    cache_time: int,
+    is_personal: bool = False,
+    paginate: bool = True,
+) -> None:
+    end = offset + (FIRST_PAGE_SIZE if offset == 0 else PAGE_SIZE)
+    results = [_track_result(track) for track in tracks[offset:end]]
 
     response = await c.answerInlineQuery(
-        message.id,
+        inline_query_id=message.id,
+        is_personal=is_personal,
         results=results,
+        cache_time=cache_time,
+        next_offset=str(end) if paginate and end < len(tracks) else "",
     )
 
     if isinstance(response, types.Error):
         c.logger.warning(f"❌ Inline response error: {response.message}")
-    return None
+
+
+def _track_result(track) -> types.InputInlineQueryResultArticle:
+    display_text = (
+        f"<b>🎧 Track:</b> <b>{html.escape(track.name)}</b>\n"
+        f"<b>👤 Artist:</b> <i>{html.escape(track.artist)}</i>\n"
+        f"<b>📅 Year:</b> {track.year}\n"
+        f"<b>⏱ Duration:</b> {track.duration // 60}:{track.duration % 60:02d} mins\n"
+        f"<b>🔗 Platform:</b> {track.platform.capitalize()}\n"
+        f"<code>{html.escape(track.id)}</code>"
+    )
+
+    parse = format_html(display_text)
+
+    reply_markup = types.ReplyMarkupInlineKeyboard(
+        [
+            [
+                types.InlineKeyboardButton(
+                    text=f"{track.name}",
+                    type=types.InlineKeyboardButtonTypeSwitchInline(query=track.artist, target_chat=types.TargetChatCurrent())
+                ),
+            ],
+        ]
+    )
+
+    return types.InputInlineQueryResultArticle(
+        id=shortener.encode_url(track.url),
+        title=f"{track.name} - {track.artist}",
+        description=f"{track.name} by {track.artist} ({track.year})",
+        thumbnail_url=track.cover_small,
+        input_message_content=types.InputMessageText(parse),
+        reply_markup=reply_markup,
+    )
 
 
 @Client.on_updateNewChosenInlineResult()
@@ -95,25 +169,49 @@ async def inline_result(c: Client, message: types.UpdateNewChosenInlineResult):
     if api.is_save_snap_url():
         return None
 
+    # Fast path: this result was sent before, so no API or CDN call is needed.
+    url_key = upload_cache.url_key(url)
+    cached = upload_cache.get_with_meta(url_key)
+    if cached:
+        file_id, meta = cached
+        sent = await _edit_with_cached_audio(c, inline_message_id, file_id, meta)
+        if not isinstance(sent, types.Error):
+            return None
+        c.logger.warning(f"❌ Cached file_id rejected, resolving track again: {sent.message}")
+        upload_cache.delete(url_key)
+
     track = await api.get_track()
     if isinstance(track, types.Error):
         return None
 
-    status_text = f"<b>🎵 {track.name}</b>\n👤 {track.artist} | 📀 {track.album}\n⏱️ {track.duration}s"
-    parsed_status = await c.parseTextEntities(status_text, types.TextParseModeHTML())
-    if isinstance(parsed_status, types.Error):
-        c.logger.warning(f"❌ Text parse error: {parsed_status.message}")
-        return None
+    status_text = (
+        f"<b>🎵 {html.escape(track.name)}</b>\n👤 {html.escape(track.artist)} | "
+        f"📀 {html.escape(track.album)}\n⏱️ {track.duration}s"
+    )
+    parsed_status = format_html(status_text)
 
     await c.editInlineMessageText(
         inline_message_id=inline_message_id,
         input_message_content=types.InputMessageText(parsed_status),
     )
 
+    caption = f"<b>{html.escape(track.name)}</b>\n<i>{html.escape(track.artist)}</i>"
+    parsed_caption = format_html(caption)
+    cache_key = upload_cache.track_key(track.platform, track.tc)
+    meta = upload_cache.track_meta(track)
+    cached_file_id = upload_cache.get(cache_key)
+    if cached_file_id:
+        sent = await _edit_with_cached_audio(c, inline_message_id, cached_file_id, meta)
+        if not isinstance(sent, types.Error):
+            upload_cache.set(url_key, cached_file_id, meta)
+            return None
+        c.logger.warning(f"❌ Cached file_id rejected, uploading again: {sent.message}")
+        upload_cache.delete(cache_key)
+
     dl = Download(track)
     result = await dl.process()
     if isinstance(result, types.Error):
-        error_text = await c.parseTextEntities(result.message, types.TextParseModeHTML())
+        error_text = format_html(html.escape(result.message))
         await c.editInlineMessageText(
             inline_message_id=inline_message_id,
             input_message_content=types.InputMessageText(error_text),
@@ -121,23 +219,6 @@ async def inline_result(c: Client, message: types.UpdateNewChosenInlineResult):
         return None
 
     audio_file, cover = result
-    caption = f"<b>{track.name}</b>\n<i>{track.artist}</i>"
-    parsed_caption = await c.parseTextEntities(caption, types.TextParseModeHTML())
-    cached_file_id = upload_cache.get(track.tc)
-    if cached_file_id:
-        await c.editInlineMessageMedia(
-            inline_message_id=inline_message_id,
-            input_message_content=types.InputMessageAudio(
-                audio=types.InputFileRemote(cached_file_id),
-                album_cover_thumbnail=types.InputThumbnail(types.InputFileLocal(cover)) if cover else None,
-                title=track.name,
-                performer=track.artist,
-                duration=track.duration,
-                caption=parsed_caption,
-            ),
-        )
-        return None
-
     upload = await c.sendAudio(
         chat_id=config.LOGGER_ID,
         audio=types.InputFileLocal(audio_file),
@@ -145,11 +226,12 @@ async def inline_result(c: Client, message: types.UpdateNewChosenInlineResult):
         title=track.name,
         performer=track.artist,
         duration=track.duration,
-        caption=caption,
+        caption=parsed_caption.text,
+        caption_entities=parsed_caption.entities,
     )
 
     if isinstance(upload, types.Error):
-        fallback_text = await c.parseTextEntities(upload.message, types.TextParseModeHTML())
+        fallback_text = format_html(html.escape(upload.message))
         await c.editInlineMessageText(
             inline_message_id=inline_message_id,
             input_message_content=types.InputMessageText(fallback_text),
@@ -157,7 +239,8 @@ async def inline_result(c: Client, message: types.UpdateNewChosenInlineResult):
         return None
 
     file_id = upload.content.audio.audio.remote.id
-    upload_cache.set(track.tc, file_id)
+    upload_cache.set(cache_key, file_id)
+    upload_cache.set(url_key, file_id, meta)
     send_audio = await c.editInlineMessageMedia(
         inline_message_id=inline_message_id,
         input_message_content=types.InputMessageAudio(
@@ -172,7 +255,7 @@ async def inline_result(c: Client, message: types.UpdateNewChosenInlineResult):
 
     if isinstance(send_audio, types.Error):
         c.logger.error(f"❌ Failed to send audio: {send_audio.message}")
-        fallback_text = await c.parseTextEntities(send_audio.message, types.TextParseModeHTML())
+        fallback_text = format_html(html.escape(send_audio.message))
         await c.editInlineMessageText(
             inline_message_id=inline_message_id,
             input_message_content=types.InputMessageText(fallback_text),
@@ -181,6 +264,23 @@ async def inline_result(c: Client, message: types.UpdateNewChosenInlineResult):
     return None
 
 
+async def _edit_with_cached_audio(
+    c: Client, inline_message_id: str, file_id: str, meta: dict
+) -> Union[types.Ok, types.Error]:
+    name, artist = meta.get("name", ""), meta.get("artist", "")
+    parsed_caption = format_html(f"<b>{html.escape(name)}</b>\n<i>{html.escape(artist)}</i>")
+    return await c.editInlineMessageMedia(
+        inline_message_id=inline_message_id,
+        input_message_content=types.InputMessageAudio(
+            audio=types.InputFileRemote(file_id),
+            title=name,
+            performer=artist,
+            duration=meta.get("duration", 0),
+            caption=parsed_caption,
+        ),
+    )
+
+
 def get_query_id():
     return str(uuid.uuid4())
 
@@ -190,7 +290,7 @@ async def process_snap_inline(c: Client, message: types.UpdateNewInlineQuery, qu
 
     if isinstance(api_data, types.Error) or not api_data:
         text = api_data.message.strip() or "An unknown error occurred."
-        parse = await c.parseTextEntities(text, types.TextParseModeHTML())
+        parse = format_html(html.escape(text))
         await c.answerInlineQuery(
             inline_query_id=message.id,
             results=[
@@ -256,7 +356,7 @@ async def process_snap_inline(c: Client, message: types.UpdateNewInlineQuery, qu
         )
 
     if len(results) == 0:
-        parse = await c.parseTextEntities("No media found for this query", types.TextParseModeHTML())
+        parse = format_html("No media found for this query")
         results.append(
             types.InputInlineQueryResultArticle(
                 id=get_query_id(),
@@ -1,23 +1,43 @@
-from typing import Union, List, Optional
+from itertools import groupby
+from typing import Dict, Union, List, Optional, Tuple
 import asyncio
 
 from pytdbot import Client, types
-from src.utils import ApiData, Filter, APIResponse, Download
-from ._utils import has_audio_stream
+from src.utils import (
+    ApiData, Filter, APIResponse, Download, canonical_media_url, media_probe, remote_urls, upload_cache,
+)
 
 
 def batch_chunks(items: List[str], size: int = 10) -> List[List[str]]:
     return [items[i:i + size] for i in range(0, len(items), size)]
 
 
+# (media type, URL or Telegram file_id, canonical source URL) of each item of a post, in send order
+MediaPlan = List[Tuple[str, str, str]]
+# What Telegram stored for each item sent, aligned with the plan; None when it gave no file_id
+SentMedia = List[Optional[Tuple[str, str]]]
+
+
+def _sent_media(message: types.Message) -> Optional[Tuple[str, str]]:
+    if message.sending_state is not None:
+        return None  # still pending, or failed inside an album
+    content = message.content
+    if isinstance(content, types.MessagePhoto) and content.photo.sizes:
+        return "photo", content.photo.sizes[-1].photo.remote.id
+    if isinstance(content, types.MessageVideo):
+        return "video", content.video.video.remote.id
+    if isinstance(content, types.MessageAnimation):
+        return "animation", content.animation.animation.remote.id
+    return None
+
+
 async def _handle_media_upload(
     client: Client,
     message: types.Message,
     media_url: str,
     media_type: str,
     reply_message: types.Message
-) -> Optional[types.Error]:
-    input_file = types.InputFileRemote(media_url)
+) -> Union[types.Message, types.Error]:
     send_func = {
         "photo": message.reply_photo,
         "video": message.reply_video,
@@ -27,8 +47,15 @@ async def _handle_media_upload(
     if not send_func:
         return types.Error(message="Unsupported media type")
 
-    result = await send_func(**{media_type: input_file})
-    if isinstance(result, types.Error) and "WEBPAGE_CURL_FAILED" in result.message:
+    # Hosts Telegram rarely manages to fetch from go straight to a local download.
+    result, curl_failed = None, False
+    if remote_urls.should_try_remote(media_url):
+        result = await send_func(**{media_type: types.InputFileRemote(media_url)})
+        curl_failed = isinstance(result, types.Error) and "WEBPAGE_CURL_FAILED" in result.message
+        if curl_failed or not isinstance(result, types.Error):
+            remote_urls.record(media_url, not curl_failed)
+
+    if result is None or curl_failed:
         local_file = await Download(None).download_file(media_url, "")
         if isinstance(local_file, types.Error):
             return local_file
@@ -37,9 +64,8 @@ async def _handle_media_upload(
 
     if isinstance(result, types.Error):
         client.logger.warning(f"❌ Media upload failed: {result.message}")
-        return result
 
-    return None
+    return result
 
 
 async def _send_media_album(
@@ -47,7 +73,7 @@ async def _send_media_album(
     message: types.Message,
     media_urls: List[str],
     media_type: str
-) -> Optional[types.Error]:
+) -> Union[types.Messages, types.Error]:
     content_cls = {
         "photo": types.InputMessagePhoto,
         "video": types.InputMessageVideo,
@@ -62,19 +88,125 @@ async def _send_media_album(
         for url in media_urls
     ]
 
-    result = await client.sendMessageAlbum(
+    # Unlike sendMessageAlbum, this waits until every message is sent and has its final file_id.
+    result = await client.sendAlbum(
         chat_id=message.chat_id,
-        input_message_contents=contents,
-        reply_to=types.InputMessageReplyToMessage(message_id=message.id),
+        contents=contents,
+        reply_to_message_id=message.id,
     )
 
     if isinstance(result, types.Error):
         client.logger.warning(f"❌ Media album upload failed: {result.message}")
-        return result
 
+    return result
+
+
+async def _send_batches(
+    client: Client,
+    message: types.Message,
+    media: List[str],
+    media_type: str,
+    reply: Optional[types.Message],
+    sent: SentMedia,
+) -> Optional[types.Error]:
+    """Send URLs or file_ids as albums of up to 10, recording what Telegram stored for each."""
+    for batch in batch_chunks(media, 10):
+        result = await (
+            _handle_media_upload(client, message, batch[0], media_type, reply)
+            if len(batch) == 1
+            else _send_media_album(client, message, batch, media_type)
+        )
+        if isinstance(result, types.Error):
+            return result
+        # Album messages are reported as each one is sent; message ids restore the send order.
+        messages = sorted(result.messages, key=lambda m: m.id) if isinstance(result, types.Messages) else [result]
+        stored = [_sent_media(msg) for msg in messages if isinstance(msg, types.Message)]
+        if len(stored) == len(batch) and all(media and media[1] for media in stored):
+            sent.extend(stored)
+        else:
+            # Which items of a partly failed album arrived is unknown; none of them is counted.
+            sent.extend([None] * len(batch))
+    return None
+
+
+async def _send_plan(
+    client: Client,
+    message: types.Message,
+    plan: MediaPlan,
+    reply: Optional[types.Message],
+    sent: SentMedia,
+) -> Optional[Tuple[str, types.Error]]:
+    """Send each run of photos, videos or animations in order; (media type, error) of the first failure."""
+    for media_type, group in groupby(plan, key=lambda item: item[0]):
+        error = await _send_batches(client, message, [ref for _, ref, _ in group], media_type, reply, sent)
+        if error is not None:
+            return media_type, error
     return None
 
 
+def _remember_post(post_id: Optional[str], plan: MediaPlan, sent: SentMedia) -> None:
+    """Cache a post only when every item of it was sent and has a file_id."""
+    if not post_id or not sent or len(sent) != len(plan) or None in sent:
+        return
+    for index, ((media_type, file_id), (_, _, source)) in enumerate(zip(sent, plan)):
+        meta = {"type": media_type, "count": len(sent), "source": source}
+        upload_cache.set(upload_cache.snap_key(post_id, index), file_id, meta)
+
+
+def _cached_post(post_id: Optional[str]) -> Optional[MediaPlan]:
+    """Everything sent for this post before, or None unless every item is still cached."""
+    if not post_id:
+        return None
+    first = upload_cache.get_with_meta(upload_cache.snap_key(post_id, 0))
+    if first is None:
+        return None
+
+    count = first[1].get("count", 0)
+    media: MediaPlan = [(first[1].get("type", ""), first[0], first[1].get("source", ""))]
+    for index in range(1, count):
+        entry = upload_cache.get_with_meta(upload_cache.snap_key(post_id, index))
+        if entry is None:
+            return None
+        media.append((entry[1].get("type", ""), entry[0], entry[1].get("source", "")))
+    return media
+
+
+def _forget_post(post_id: str, count: int) -> None:
+    for index in range(count):
+        upload_cache.delete(upload_cache.snap_key(post_id, index))
+
+
+async def _plan_post(client: Client, api_data: APIResponse) -> Tuple[MediaPlan, bool]:
+    """
+    Order a post's media the way it is sent: photos, videos with sound, then silent videos as animations.
+
+    The flag is False when an item had to be left out, so the post must not be cached.
+    """
+    plan: MediaPlan = [("photo", url, canonical_media_url(url)) for url in api_data.image or []]
+    video_urls = [v.video for v in api_data.video or [] if v.video]
+    if len(video_urls) == 1:
+        return plan + [("video", video_urls[0], canonical_media_url(video_urls[0]))], True
+
+    # Check audio presence concurrently; the probe bounds and caches the work
+    results = await asyncio.gather(
+        *(media_probe.has_audio(url) for url in video_urls),
+        return_exceptions=True
+    )
+
+    complete = True
+    videos_with_audio, videos_without_audio = [], []
+    for url, result in zip(video_urls, results):
+        if isinstance(result, Exception):
+            client.logger.warning(f"❌ Failed to check audio for {url}: {result}")
+            complete = False
+            continue
+        (videos_with_audio if result else videos_without_audio).append(url)
+
+    plan += [("video", url, canonical_media_url(url)) for url in videos_with_audio]
+    plan += [("animation", url, canonical_media_url(url)) for url in videos_without_audio]
+    return plan, complete
+
+
 @Client.on_message(filters=Filter.command("insta"))
 async def insta_cmd(client: Client, message: types.Message) -> None:
     parts = message.text.split(" ", 1)
@@ -90,8 +222,21 @@ async def insta_autodetect(client: Client, message: types.Message):
 
 
 async def process_insta_query(client: Client, message: types.Message, query: str) -> None:
-    reply = await message.reply_text("⏳ Processing...")
     api = ApiData(query)
+    post_id = api.snap_post_id()
+    # Source URL -> what was already delivered from the cache before a file_id was rejected.
+    delivered: Dict[str, Tuple[str, str]] = {}
+    cached = _cached_post(post_id)
+    if cached:
+        sent: SentMedia = []
+        failure = await _send_plan(client, message, cached, None, sent)
+        if not failure:
+            return
+        client.logger.warning(f"❌ Cached snap media rejected, fetching again: {failure[1].message}")
+        _forget_post(post_id, len(cached))
+        delivered = {source: media for (_, _, source), media in zip(cached, sent) if source and media}
+
+    reply = await message.reply_text("⏳ Processing...")
     api_data: Union[APIResponse, types.Error, None] = await api.get_snap()
 
     if isinstance(api_data, types.Error):
@@ -101,75 +246,24 @@ async def process_insta_query(client: Client, message: types.Message, query: str
         await reply.edit_text("❌ No results found.")
         return
 
-    # --- Handle Images ---
-    if api_data.image:
-        for batch in batch_chunks(api_data.image, 10):
-            error = await (
-                _handle_media_upload(client, message, batch[0], "photo", reply)
-                if len(batch) == 1
-                else _send_media_album(client, message, batch, "photo")
-            )
-            if error:
-                await reply.edit_text(f"❌ Failed to send photo(s): {error.message}")
-                return
-
-    # --- Handle Videos ---
-    if api_data.video:
-        video_urls = [v.video for v in api_data.video if v.video]
-        if not video_urls:
+    plan, complete = await _plan_post(client, api_data)
+    if not plan:
+        if complete:
             await reply.delete()
-            return
-
-        if len(video_urls) == 1:
-            error = await _handle_media_upload(client, message, video_urls[0], "video", reply)
-            if error:
-                await reply.edit_text(f"❌ Failed to send video: {error.message}")
-            else:
-                await reply.delete()
-            return
-
-        # Check audio presence concurrently
-        results = await asyncio.gather(
-            *(has_audio_stream(url) for url in video_urls),
-            return_exceptions=True
-        )
-
-        videos_with_audio, videos_without_audio = [], []
-        for url, result in zip(video_urls, results):
-            if isinstance(result, Exception):
-                client.logger.warning(f"❌ Failed to check audio for {url}: {result}")
-                continue
-            (videos_with_audio if result else videos_without_audio).append(url)
-
-        if not videos_with_audio and not videos_without_audio:
+        else:
             await reply.edit_text("❌ No valid videos found.")
-            return
-
-        # Send videos with audio
-        for batch in batch_chunks(videos_with_audio, 10):
-            error = await (
-                _handle_media_upload(client, message, batch[0], "video", reply)
-                if len(batch) == 1
-                else _send_media_album(client, message, batch, "video")
-            )
-            if error:
-                await reply.edit_text(f"❌ Failed to send video(s): {error.message}")
-                return
-
-        if not videos_without_audio:
-            await reply.delete()
-            return
+        return
 
-        # Send videos without audio as animations
-        for batch in batch_chunks(videos_without_audio, 10):
-            error = await (
-                _handle_media_upload(client, message, batch[0], "animation", reply)
-                if len(batch) == 1
-                else _send_media_album(client, message, batch, "animation")
-            )
-            if error:
-                await reply.edit_text(f"❌ Failed to send animation(s): {error.message}")
-                return
+    # Items are matched by source, since a fresh plan may order or type them differently.
+    pending = [item for item in plan if item[2] not in delivered]
+    sent = []
+    failure = await _send_plan(client, message, pending, reply, sent)
+    if failure:
+        media_type, error = failure
+        await reply.edit_text(f"❌ Failed to send {media_type}(s): {error.message}")
+        return
 
+    if complete:
+        fresh = iter(sent)
+        _remember_post(post_id, plan, [delivered.get(source) or next(fresh) for _, _, source in plan])
     await reply.delete()
-    return
@@ -2,7 +2,7 @@ import re
 
 from pytdbot import Client, types
 
-from src.utils import ApiData, shortener, Filter, download_playlist_zip
+from src.utils import ApiData, shortener, Filter, download_playlist_zip, prefetcher, upload_cache
 
 
 async def process_spotify_query(message: types.Message, query: str):
@@ -31,12 +31,15 @@ async def process_spotify_query(message: types.Message, query: str):
         for track in song_data.results
     ]
 
-    await response.edit_text(
+    edited = await response.edit_text(
         f"Search results for: <b>{query}</b>\n\nPlease tap on the song you want to download.",
         parse_mode="html",
         disable_web_page_preview=True,
         reply_markup=types.ReplyMarkupInlineKeyboard(keyboard),
     )
+    if not isinstance(edited, types.Error):
+        # Most users tap the first result; warm it while they read the list.
+        prefetcher.warm((response.chat_id, response.id), [track.url for track in song_data.results])
 
 
 @Client.on_message(filters=Filter.command(["spot", "spotify", "song"]))
@@ -84,12 +87,21 @@ async def dl_playlist(c: Client, message: types.Message):
         await message.reply_text("⚠️ The playlist contains more than 15 tracks. Please download each track individually.")
         return
 
+    cache_key = upload_cache.playlist_key(t.url for t in result.results)
+    cached_file_id = upload_cache.get(cache_key)
+    if cached_file_id:
+        ok = await message.reply_document(types.InputFileRemote(cached_file_id))
+        if not isinstance(ok, types.Error):
+            return
+        upload_cache.delete(cache_key)
+
     reply = await message.reply_text(f"⏳ Downloading {len(result.results)} tracks and creating ZIP…")
 
-    zip_path = await download_playlist_zip(result)
-    if not zip_path:
+    archive = await download_playlist_zip(result)
+    if not archive:
         await message.reply_text("❌ Failed to download any tracks. Please try again.")
         return
+    zip_path, added = archive
 
     ok = await c.editMessageMedia(
         chat_id=reply.chat_id,
@@ -99,3 +111,7 @@ async def dl_playlist(c: Client, message: types.Message):
     if isinstance(ok, types.Error):
         await message.reply_text(f"❌ Error: {ok.message}")
         return
+
+    # An archive missing tracks is not what this playlist should resend next time.
+    if added == len(result.results) and isinstance(ok.content, types.MessageDocument):
+        upload_cache.set(cache_key, ok.content.document.document.remote.id)
@@ -0,0 +1,51 @@
+from typing import Dict
+
+from pytdbot import Client, types
+
+from src import config
+from src.utils import (
+    ApiData, Filter, HttpClient, disk_cache, inline_sessions, media_probe, prefetcher, remote_urls,
+    upload_cache
+)
+from src.utils._downloader import _inflight
+from src.utils._resilience import resilience
+from src.utils._scheduler import download_scheduler
+
+
+def _format_section(title: str, values: Dict[str, object]) -> str:
+    lines = [f"<b>{title}</b>"]
+    lines.extend(f"  {key}: <code>{value}</code>" for key, value in values.items())
+    return "\n".join(lines)
+
+
+def collect_stats() -> Dict[str, Dict[str, object]]:
+    return {
+        "API response cache": ApiData.cache_stats(),
+        "API in-flight": ApiData.inflight_stats(),
+        **{f"Hedging: {name}": values for name, values in ApiData.hedge_stats().items()},
+        "Upload cache": upload_cache.stats(),
+        "Disk cache": disk_cache.stats(),
+        "In-flight downloads": _inflight.stats(),
+        "Prefetch": prefetcher.stats(),
+        "Inline sessions": inline_sessions.stats(),
+        "Media probe": media_probe.stats(),
+        "Remote URL uploads": remote_urls.stats(),
+        **{f"Downloads: {platform}": values for platform, values in download_scheduler.stats().items()},
+        **{f"HTTP pool: {name}": values for name, values in HttpClient.stats().items()},
+        **{f"Circuit: {host}": values for host, values in resilience.stats().items()},
+    }
+
+
+@Client.on_message(filters=Filter.command("stats"))
+async def stats_cmd(client: Client, message: types.Message) -> None:
+    # Admin only: the log group is where the operators are.
+    if message.chat_id != config.LOGGER_ID:
+        return None
+
+    text = "📈 <b>Bot Metrics</b>\n\n" + "\n\n".join(
+        _format_section(title, values) for title, values in collect_stats().items()
+    )
+    done = await message.reply_text(text, parse_mode="html", disable_web_page_preview=True)
+    if isinstance(done, types.Error):
+        client.logger.warning(f"Error sending stats: {done.message}")
+    return None
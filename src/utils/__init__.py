@@ -1,15 +1,30 @@
-from ._api import ApiData, HttpClient
+from ._api import ApiData
+from ._http import HttpClient
 from ._cache import shortener, upload_cache
+from ._disk_cache import disk_cache
 from ._downloader import Download, download_playlist_zip
 from ._filters import Filter
-from ._dataclass import APIResponse
+from ._formatting import format_html
+from ._prefetch import prefetcher
+from ._media_probe import canonical_media_url, media_probe
+from ._remote_urls import remote_urls
+from ._inline_index import inline_sessions
+from ._dataclass import APIResponse, TrackInfo
 __all__ = [
     "ApiData",
     "Download",
     "Filter",
+    "format_html",
+    "disk_cache",
     "download_playlist_zip",
     "shortener",
     "upload_cache",
     "APIResponse",
-    "HttpClient"
+    "TrackInfo",
+    "HttpClient",
+    "prefetcher",
+    "media_probe",
+    "canonical_media_url",
+    "remote_urls",
+    "inline_sessions",
 ]
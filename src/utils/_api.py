@@ -1,66 +1,60 @@
-import re
 import urllib.parse
-from typing import Dict, Union, Optional
+from typing import Callable, Dict, Optional, TypeVar, Union
 import httpx
 from pytdbot import types
 from concurrent.futures import ThreadPoolExecutor
 from src import config
-from src.utils._dataclass import PlatformTracks, TrackInfo, MusicTrack, APIResponse
+from src.utils._cache import TTLCache
+from src.utils._hedge import Hedger
+from src.utils._http import HttpClient
+from src.utils._resilience import resilience
+from src.utils._router import url_router
+from src.utils._dataclass import PlatformTracks, TrackInfo, TrackInfoAdapter, APIResponse
+from src.utils._singleflight import SingleFlight
 
 # Constants
-DOWNLOAD_TIMEOUT = 300.0  # Total timeout in seconds
-CONNECT_TIMEOUT = 30.0  # Connect timeout in seconds
 DEFAULT_LIMIT = "10"
 MAX_QUERY_LENGTH = 500
-MAX_URL_LENGTH = 5000
 HEADER_ACCEPT = "Accept"
 HEADER_API_KEY = "X-API-Key"
 MIME_APPLICATION = "application/json"
-MAX_CONCURRENT_DOWNLOADS = 5
-_client: Optional[httpx.AsyncClient] = None
 _executor = ThreadPoolExecutor(max_workers=4)
 
-URL_PATTERNS = {
-    "spotify": re.compile(
-        r'^(https?://)?([a-z0-9-]+\.)*spotify\.com/(track|playlist|album|artist)/[a-zA-Z0-9]+(\?.*)?$'),
-    "youtube": re.compile(r'^(https?://)?([a-z0-9-]+\.)*(youtube\.com/watch\?v=|youtu\.be/)[\w-]+(\?.*)?$'),
-    "youtube_music": re.compile(r'^(https?://)?([a-z0-9-]+\.)*youtube\.com/(watch\?v=|playlist\?list=)[\w-]+(\?.*)?$'),
-    "soundcloud": re.compile(r'^(https?://)?([a-z0-9-]+\.)*soundcloud\.com/[\w-]+(/[\w-]+)?(/sets/[\w-]+)?(\?.*)?$'),
-    "apple_music": re.compile(
-        r'^(https?://)?([a-z0-9-]+\.)?apple\.com/[a-z]{2}/(album|playlist|song)/[^/]+/(pl\.[a-zA-Z0-9]+|\d+)(\?i=\d+)?(\?.*)?$')
+# Response cache TTLs in seconds. Track and snap responses carry signed
+# media URLs, so they are kept short.
+CACHE_TTLS = {
+    "search": 600,
+    "get_info": 1800,
+    "get_track": 300,
+    "get_snap": 300,
 }
+# How long past their TTL results may still be served while a refresh runs,
+# for callers that ask for it.
+STALE_TTLS = {
+    "search": 3600,
+    "get_info": 3600,
+}
+NOT_FOUND_CACHE_TTL = 60
+ERROR_CACHE_TTL = 10
+RESPONSE_CACHE_SIZE = 1024
+_response_cache = TTLCache(RESPONSE_CACHE_SIZE)
+# Nobody needs a response once every caller waiting for it has gone away
+# (e.g. an inline query superseded by the next keystroke).
+_inflight = SingleFlight(cancel_orphans=True)
 
+# Latency-sensitive endpoints that may send a duplicate request when slow.
+HEDGED_ENDPOINTS = ("search", "get_track")
+_hedgers: Dict[str, Hedger] = {
+    name: Hedger(config.HEDGE_PERCENTILE, config.HEDGE_BUDGET_PERCENT / 100)
+    for name in HEDGED_ENDPOINTS
+} if config.API_HEDGING else {}
 
-class HttpClient:
-    @staticmethod
-    async def get_client() -> httpx.AsyncClient:
-        global _client
-        if _client is None or _client.is_closed:
-            limits = httpx.Limits(
-                max_connections=MAX_CONCURRENT_DOWNLOADS,
-                max_keepalive_connections=MAX_CONCURRENT_DOWNLOADS
-            )
-
-            _client = httpx.AsyncClient(
-                timeout=httpx.Timeout(
-                    connect=CONNECT_TIMEOUT,
-                    read=DOWNLOAD_TIMEOUT,
-                    write=DOWNLOAD_TIMEOUT,
-                    pool=None
-                ),
-                limits=limits,
-                follow_redirects=True,
-                trust_env=True
-            )
-        return _client
+T = TypeVar("T")
 
-    @staticmethod
-    async def close_client():
-        global _client
-        if _client is not None:
-            await _client.aclose()
-            _client = None
 
+def _is_final(result) -> bool:
+    """A response worth returning: data, or an error the upstream will repeat."""
+    return not isinstance(result, types.Error) or 400 <= result.code < 500
 
 class ApiData:
     def __init__(self, query: str):
@@ -68,106 +62,30 @@ class ApiData:
         self.query = self._sanitize_input(query) if query else ""
 
     def is_valid(self) -> bool:
-        raw_url = self.query
-        if not raw_url or len(raw_url) > MAX_URL_LENGTH:
-            return False
-
-        if not re.match("^https?://", raw_url):
-            return False
-
-        try:
-            parsed = urllib.parse.urlparse(raw_url)
-            if not all([parsed.scheme, parsed.netloc]):
-                return False
-        except ValueError:
-            return False
-
-        return any(pattern.search(raw_url) for pattern in URL_PATTERNS.values())
+        return url_router.is_track(self.query)
 
     def is_save_snap_url(self) -> bool:
-        insta_regex = re.compile(r"(?i)https?://(?:www\.)?(instagram\.com|instagr\.am)/(reel|stories|p|tv)/[^\s/?]+")
-        pin_regex = re.compile(r"(?i)https?://(?:[a-z]+\.)?(pinterest\.com|pin\.it)/[^\s]+")
-        fb_watch_regex = re.compile(r"(?i)https?://(?:www\.)?fb\.watch/[^\s/?]+")
-        fb_video_regex = re.compile(r"(?i)https?://(?:www\.)?facebook\.com/.+/videos/\d+")
-        tiktok_regex = re.compile(
-            r"https?://(?:www\.|m\.)?(?:vt\.)?tiktok\.com/(?:@[\w.-]+/video/\d+|v/\d+\.html|t/[\w]+|[\w]+)",
-            re.IGNORECASE
-        )
-        x_regex = re.compile(
-            r"(https?://(?:www\.)?(?:x|twitter)\.com/[^\s]+)",
-            re.IGNORECASE
-        )
-        threads_redex = re.compile(
-            r'^https?://(?:www\.)?threads\.(?:com|net)/@[\w.-]+/post/[\w-]+(?:\?[\w=&%-]+)?$',
-            re.IGNORECASE
-        )
-        reddit_regex = re.compile(
-            r"https?://(?:www\.|old\.)?reddit\.com/r/[\w]+/comments/[\w]+(?:/[^\s]*)?|https?://redd\.it/[\w]+",
-            re.IGNORECASE
-        )
-        twitch_clip_regex = re.compile(
-            r"https?://(?:clips\.twitch\.tv/|(?:www\.)?twitch\.tv/[^/]+/clip/)([\w-]+(?:-\w+)*)",
-            re.IGNORECASE
-        )
+        return url_router.is_snap(self.query)
 
-        return any(
-            regex.search(self.query)
-            for regex in (insta_regex, pin_regex, fb_watch_regex, fb_video_regex, tiktok_regex, x_regex, threads_redex, reddit_regex, twitch_clip_regex)
-        )
+    def snap_post_id(self) -> Optional[str]:
+        return url_router.snap_post_id(self.query)
 
-    async def get_info(self) -> Union[types.Error, PlatformTracks]:
+    async def get_info(self, stale_ok: bool = False) -> Union[types.Error, PlatformTracks]:
         if not self.is_valid():
             return types.Error(message="Url is not valid")
-        return await self._fetch_data(self.query)
+        return await self._fetch_data(self.query, stale_ok)
 
-    async def _fetch_data(self, raw_url: str) -> Union[types.Error, PlatformTracks]:
+    async def _fetch_data(self, raw_url: str, stale_ok: bool = False) -> Union[types.Error, PlatformTracks]:
         endpoint = f"{self.api_url}/get_url?url={urllib.parse.quote(raw_url)}"
-        headers = self._get_headers()
-        client = await HttpClient.get_client()
+        return await self._get("get_info", raw_url, endpoint, PlatformTracks.model_validate_json, stale_ok)
 
-        try:
-            response = await client.get(
-                endpoint,
-                headers=headers
-            )
-            response.raise_for_status()
-            raw_data = response.json()
-            results = [MusicTrack(**track) for track in raw_data.get("results", [])]
-            return PlatformTracks(results=results)
-        except httpx.HTTPStatusError as e:
-            return types.Error(message=f"Request failed with status: {e.response.status_code}")
-        except httpx.RequestError as e:
-            return types.Error(message=f"HTTP request failed: {e}")
-        except (ValueError, TypeError) as e:
-            return types.Error(message=f"Failed to parse JSON response: {e}")
-        except Exception as e:
-            return types.Error(message=f"Unexpected error: {e}")
-
-    async def search(self, limit: str = DEFAULT_LIMIT) -> Union[types.Error, PlatformTracks]:
+    async def search(self, limit: str = DEFAULT_LIMIT, stale_ok: bool = False) -> Union[types.Error, PlatformTracks]:
         endpoint = (
             f"{self.api_url}/search_track/{urllib.parse.quote(self.query)}"
             f"?lim={urllib.parse.quote(limit)}"
         )
-        headers = self._get_headers()
-        client = await HttpClient.get_client()
-
-        try:
-            response = await client.get(
-                endpoint,
-                headers=headers
-            )
-            response.raise_for_status()
-            raw_data = response.json()
-            results = [MusicTrack(**track) for track in raw_data.get("results", [])]
-            return PlatformTracks(results=results)
-        except httpx.HTTPStatusError as e:
-            return types.Error(message=f"Request failed with status: {e.response.status_code}")
-        except httpx.RequestError as e:
-            return types.Error(message=f"HTTP request failed: {e}")
-        except (ValueError, TypeError) as e:
-            return types.Error(message=f"Failed to parse JSON response: {e}")
-        except Exception as e:
-            return types.Error(message=f"Unexpected error: {e}")
+        cache_key = (" ".join(self.query.lower().split()), limit)
+        return await self._get("search", cache_key, endpoint, PlatformTracks.model_validate_json, stale_ok)
 
     async def get_track(self) -> Union[types.Error, TrackInfo]:
         track_id = self.query
@@ -175,44 +93,69 @@ class ApiData:
             return types.Error(message="Empty track ID")
 
         endpoint = f"{self.api_url}/get_track?id={urllib.parse.quote(track_id)}"
-        headers = self._get_headers()
-        client = await HttpClient.get_client()
-
-        try:
-            response = await client.get(
-                endpoint,
-                headers=headers
-            )
-            response.raise_for_status()
-            raw_data = response.json()
-            return TrackInfo(**raw_data)
-        except httpx.HTTPStatusError as e:
-            return types.Error(message=f"Request failed with status: {e.response.status_code}")
-        except httpx.RequestError as e:
-            return types.Error(message=f"HTTP request failed: {e}")
-        except (ValueError, TypeError) as e:
-            return types.Error(message=f"Failed to parse JSON response: {e}")
-        except Exception as e:
-            return types.Error(message=f"Unexpected error: {e}")
+        return await self._get("get_track", track_id, endpoint, TrackInfoAdapter.validate_json)
 
     async def get_snap(self) -> Union[types.Error, APIResponse]:
         if not self.is_save_snap_url():
             return types.Error(message="Url is not valid")
 
         endpoint = f"{self.api_url}/snap?url={urllib.parse.quote(self.query)}"
+        return await self._get("get_snap", self.query, endpoint, APIResponse.model_validate_json)
+
+    async def _get(
+        self, name: str, cache_key, endpoint: str, parse: Callable[[bytes], T], stale_ok: bool = False
+    ) -> Union[types.Error, T]:
+        """
+        GET an API endpoint through the response cache; errors are cached briefly too.
+
+        Concurrent misses for the same key share one upstream request. With
+        `stale_ok`, an expired result still in its stale window is returned
+        at once and refreshed in the background.
+        """
+        key = (name, cache_key)
+        cached = _response_cache.get(key)
+        if cached is not TTLCache.MISSING:
+            return cached
+
+        fetch = lambda: self._fetch_and_cache(key, endpoint, parse)
+        if stale_ok:
+            stale = _response_cache.get_stale(key)
+            if stale is not TTLCache.MISSING:
+                _inflight.start(key, fetch)
+                return stale
+
+        return await _inflight.do(key, fetch)
+
+    async def _fetch_and_cache(self, key: tuple, endpoint: str, parse: Callable[[bytes], T]) -> Union[types.Error, T]:
+        name = key[0]
+        hedger = _hedgers.get(name)
+        if hedger is not None:
+            result = await hedger.run(lambda: self._request(endpoint, parse), accept=_is_final)
+        else:
+            result = await self._request(endpoint, parse)
+        if isinstance(result, types.Error):
+            # A failed refresh must not replace a stale result that is still being served.
+            if _response_cache.peek(key) is TTLCache.MISSING:
+                ttl = NOT_FOUND_CACHE_TTL if result.code == 404 else ERROR_CACHE_TTL
+                _response_cache.set(key, result, ttl)
+        else:
+            _response_cache.set(key, result, CACHE_TTLS[name], STALE_TTLS.get(name, 0))
+        return result
+
+    async def _request(self, endpoint: str, parse: Callable[[bytes], T]) -> Union[types.Error, T]:
         headers = self._get_headers()
-        client = await HttpClient.get_client()
+        client = await HttpClient.get_client("api")
 
         try:
-            response = await client.get(
-                endpoint,
-                headers=headers
-            )
+            response = await resilience.get(client, endpoint, headers=headers)
             response.raise_for_status()
-            raw_data = response.json()
-            return APIResponse(**raw_data)
+            # Validated straight from the body bytes, no intermediate dicts.
+            return parse(response.content)
         except httpx.HTTPStatusError as e:
-            return types.Error(message=f"Request failed with status: {e.response.status_code}")
+            return types.Error(
+                code=e.response.status_code,
+                message=f"Request failed with status: {e.response.status_code}"
+            )
         except httpx.RequestError as e:
             return types.Error(message=f"HTTP request failed: {e}")
         except (ValueError, TypeError) as e:
@@ -220,6 +163,18 @@ class ApiData:
         except Exception as e:
             return types.Error(message=f"Unexpected error: {e}")
 
+    @staticmethod
+    def cache_stats() -> Dict[str, object]:
+        return _response_cache.stats()
+
+    @staticmethod
+    def inflight_stats() -> Dict[str, int]:
+        return _inflight.stats()
+
+    @staticmethod
+    def hedge_stats() -> Dict[str, Dict[str, object]]:
+        return {name: hedger.stats() for name, hedger in _hedgers.items()}
+
     @staticmethod
     def _get_headers() -> Dict[str, str]:
         return {
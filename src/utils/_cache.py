@@ -1,23 +1,305 @@
 import hashlib
+import logging
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
 from threading import RLock
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
 from collections import OrderedDict
 
-# TODO: use mongo
-class UploadCache:
-    def __init__(self):
-        self.cache = OrderedDict()
+import ujson
 
-    def get(self, key: str) -> str | None:
-        return self.cache.get(key)
+from src import config
+
+logger = logging.getLogger(__name__)
+
+
+# (file_id, JSON metadata or None)
+UploadEntry = Tuple[str, Optional[str]]
+
+
+class UploadCacheBackend(ABC):
+    """Storage for Telegram file_ids. Expired entries must read as missing."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[UploadEntry]:
+        ...
 
-    def set(self, key: str, file_id: str) -> None:
-        self.cache[key] = file_id
+    @abstractmethod
+    def set(self, key: str, file_id: str, meta: Optional[str], expires_at: float) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryUploadBackend(UploadCacheBackend):
+    def __init__(self, max_entries: int = 2000):
+        self.cache: "OrderedDict[str, tuple[str, Optional[str], float]]" = OrderedDict()
+        self.max_entries = max_entries
+
+    def get(self, key: str) -> Optional[UploadEntry]:
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if entry[2] < time.time():
+            del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return entry[0], entry[1]
+
+    def set(self, key: str, file_id: str, meta: Optional[str], expires_at: float) -> None:
+        self.cache[key] = (file_id, meta, expires_at)
         self.cache.move_to_end(key)
-        if len(self.cache) > 2000:
+        if len(self.cache) > self.max_entries:
             self.cache.popitem(last=False)
 
-upload_cache = UploadCache()
+    def delete(self, key: str) -> None:
+        self.cache.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+
+class SQLiteUploadBackend(UploadCacheBackend):
+    """File-backed store so file_ids survive restarts. Lookups are local and sub-millisecond."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = RLock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            "key TEXT PRIMARY KEY, file_id TEXT NOT NULL, expires_at REAL NOT NULL, meta TEXT)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(uploads)")}
+        if "meta" not in columns:
+            self._db.execute("ALTER TABLE uploads ADD COLUMN meta TEXT")
+        self._db.execute("DELETE FROM uploads WHERE expires_at < ?", (time.time(),))
+
+    def get(self, key: str) -> Optional[UploadEntry]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT file_id, meta FROM uploads WHERE key = ? AND expires_at >= ?", (key, time.time())
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, key: str, file_id: str, meta: Optional[str], expires_at: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO uploads (key, file_id, expires_at, meta) VALUES (?, ?, ?, ?)",
+                (key, file_id, expires_at, meta),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM uploads WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM uploads").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class UploadCache:
+    """
+    Telegram file_ids of media we already uploaded, so it can be resent without a download.
+
+    The backend is opened on first use, so importing this module never creates files.
+    """
+
+    def __init__(self, backend_factory: Callable[[], UploadCacheBackend], ttl: int):
+        self._backend_factory = backend_factory
+        self._backend: Optional[UploadCacheBackend] = None
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self) -> UploadCacheBackend:
+        if self._backend is None:
+            self._backend = self._backend_factory()
+        return self._backend
+
+    @staticmethod
+    def track_key(platform: str, tc: str) -> str:
+        return f"audio:{platform}:{tc}"
+
+    @staticmethod
+    def url_key(url: str) -> str:
+        """Key for the URL a search result points at, known before any API call."""
+        return f"url:{url}"
+
+    @staticmethod
+    def snap_key(post_id: str, index: int) -> str:
+        """Key for the `index`-th media item sent for a snap post."""
+        return f"snap:{post_id}:{index}"
+
+    @staticmethod
+    def playlist_key(urls: Iterable[str]) -> str:
+        """Key for the archive of a playlist's tracks, in any order."""
+        return "playlist:" + hashlib.sha256("\n".join(sorted(urls)).encode()).hexdigest()
+
+    @staticmethod
+    def track_meta(track) -> Dict[str, Any]:
+        """What a sender needs to rebuild the audio message without the API."""
+        return {"name": track.name, "artist": track.artist, "album": track.album, "duration": track.duration}
+
+    def get(self, key: str) -> str | None:
+        entry = self.get_with_meta(key)
+        return entry[0] if entry else None
+
+    def get_with_meta(self, key: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        try:
+            entry = self.backend.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Upload cache read failed: {e}")
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        file_id, meta = entry
+        try:
+            return file_id, ujson.loads(meta) if meta else {}
+        except ValueError:
+            return file_id, {}
+
+    def contains(self, key: str) -> bool:
+        """Peek without counting a hit or miss."""
+        try:
+            return self.backend.get(key) is not None
+        except sqlite3.Error:
+            return False
+
+    def set(self, key: str, file_id: str, meta: Optional[Dict[str, Any]] = None) -> None:
+        try:
+            self.backend.set(key, file_id, ujson.dumps(meta) if meta else None, time.time() + self.ttl)
+        except sqlite3.Error as e:
+            logger.warning(f"Upload cache write failed: {e}")
+
+    def delete(self, key: str) -> None:
+        try:
+            self.backend.delete(key)
+        except sqlite3.Error as e:
+            logger.warning(f"Upload cache delete failed: {e}")
+
+    def close(self) -> None:
+        if self._backend is not None:
+            self._backend.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self.backend), "hits": self.hits, "misses": self.misses}
+
+
+def _make_upload_backend() -> UploadCacheBackend:
+    if not config.UPLOAD_CACHE_PATH:
+        return MemoryUploadBackend()
+    try:
+        return SQLiteUploadBackend(Path(config.UPLOAD_CACHE_PATH))
+    except sqlite3.Error as e:
+        logger.warning(f"Falling back to in-memory upload cache: {e}")
+        return MemoryUploadBackend()
+
+
+upload_cache = UploadCache(_make_upload_backend, ttl=config.UPLOAD_CACHE_TTL_HOURS * 3600)
+
+class TTLCache:
+    """
+    Bounded LRU whose entries also expire after a per-entry TTL.
+
+    An entry may outlive its TTL by a stale window, during which `get`
+    misses but `get_stale` still returns it, so callers can serve the old
+    value while they refresh it.
+
+    Values are shared between callers and must be treated as read-only.
+    Hits and misses are counted per namespace (the first item of a tuple key).
+    """
+
+    MISSING = object()
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # key -> (fresh until, stale until, value)
+        self._entries: "OrderedDict[Hashable, tuple[float, float, Any]]" = OrderedDict()
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self.stale_hits: Dict[str, int] = {}
+
+    @staticmethod
+    def _namespace(key: Hashable) -> str:
+        return str(key[0]) if isinstance(key, tuple) and key else "default"
+
+    def _lookup(self, key: Hashable, now: float) -> Optional[tuple]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] < now:
+            del self._entries[key]
+            return None
+        return entry
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value, or `TTLCache.MISSING`."""
+        namespace = self._namespace(key)
+        now = time.monotonic()
+        entry = self._lookup(key, now)
+        if entry is None or entry[0] < now:
+            self.misses[namespace] = self.misses.get(namespace, 0) + 1
+            return self.MISSING
+
+        self._entries.move_to_end(key)
+        self.hits[namespace] = self.hits.get(namespace, 0) + 1
+        return entry[2]
+
+    def peek(self, key: Hashable) -> Any:
+        """Return any live or stale value without touching stats or LRU order."""
+        entry = self._lookup(key, time.monotonic())
+        return self.MISSING if entry is None else entry[2]
+
+    def get_stale(self, key: Hashable) -> Any:
+        """Return a value past its TTL but inside its stale window, or `TTLCache.MISSING`."""
+        entry = self._lookup(key, time.monotonic())
+        if entry is None:
+            return self.MISSING
+
+        namespace = self._namespace(key)
+        self.stale_hits[namespace] = self.stale_hits.get(namespace, 0) + 1
+        return entry[2]
+
+    def set(self, key: Hashable, value: Any, ttl: float, stale_ttl: float = 0) -> None:
+        if ttl <= 0:
+            return
+        now = time.monotonic()
+        self._entries[key] = (now + ttl, now + ttl + stale_ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, object]:
+        stats: Dict[str, object] = {"entries": f"{len(self._entries)}/{self.max_entries}"}
+        for namespace in sorted(set(self.hits) | set(self.misses)):
+            hits, misses = self.hits.get(namespace, 0), self.misses.get(namespace, 0)
+            stale = self.stale_hits.get(namespace, 0)
+            stats[namespace] = f"{hits}/{hits + misses} hits ({hits / (hits + misses):.0%})" + (
+                f", {stale} served stale" if stale else ""
+            )
+        return stats
+
 
 class URLShortener:
     def __init__(self):
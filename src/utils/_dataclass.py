@@ -1,8 +1,12 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
+from pydantic.dataclasses import dataclass
 from typing import List, Optional, Union
 
 
-class TrackInfo(BaseModel):
+# Tracks are held in response caches by the thousand; slotted dataclasses
+# are a fraction of the size of a BaseModel instance.
+@dataclass(slots=True)
+class TrackInfo:
     cdnurl: str
     key: str
     name: str
@@ -15,7 +19,8 @@ class TrackInfo(BaseModel):
     duration: int
     platform: str
 
-class MusicTrack(BaseModel):
+@dataclass(slots=True)
+class MusicTrack:
     name: str
     artist: str
     id: str
@@ -27,7 +32,7 @@ class MusicTrack(BaseModel):
     platform: str
 
 class PlatformTracks(BaseModel):
-    results: List[MusicTrack]
+    results: List[MusicTrack] = []
 
 class APIVideo(BaseModel):
     video: Optional[str] = None
@@ -36,3 +41,6 @@ class APIVideo(BaseModel):
 class APIResponse(BaseModel):
     video: List[APIVideo] = []
     image: Union[List[str], None] = None
+
+
+TrackInfoAdapter = TypeAdapter(TrackInfo)
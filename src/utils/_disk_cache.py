@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import ujson
+
+from src import config
+
+INDEX_FILE = "cache_index.json"
+TEMP_PREFIX = ".sptube-"
+DEFAULT_FILE_PERM = 0o644
+EVICT_INTERVAL = 600  # seconds between background sweeps
+EVICT_GRACE = 300  # never evict files touched this recently, they may be uploading
+KEY_LENGTH = 32
+MAX_NAME_LENGTH = 120  # bytes; leaves room for the key directory under common path limits
+
+logger = logging.getLogger(__name__)
+
+
+def _file_name(name: str, fallback: str) -> str:
+    """`name` as a single path component, shortened to MAX_NAME_LENGTH bytes with its suffix kept."""
+    name = Path(name.replace("\\", "/")).name.strip()
+    if name.startswith("."):
+        name = fallback + name
+    stem, suffix = os.path.splitext(name)
+    encoded = stem.encode()
+    if len(encoded) + len(suffix) > MAX_NAME_LENGTH:
+        stem = encoded[:MAX_NAME_LENGTH - len(suffix)].decode(errors="ignore").rstrip()
+    return f"{stem or fallback}{suffix}"
+
+
+class DiskCache:
+    """
+    Size- and age-bounded cache of downloaded media under DOWNLOAD_PATH.
+
+    Each file lives in a directory named after a hash of its key, under the
+    readable name it is uploaded with, and is published with an atomic
+    rename. A JSON index holds its path, size and last access time. Only
+    files in the index are ever deleted; the directory is shared with the
+    TDLib database.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, max_age: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.index_path = root / INDEX_FILE
+        # key -> [file name, size, last access]
+        self._entries: Dict[str, List] = {}
+        self._total = 0
+        self._dirty = False
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        return hashlib.sha256(":".join(parts).encode()).hexdigest()[:KEY_LENGTH]
+
+    def path_for(self, key: str, name: str) -> Path:
+        return self.root / key / _file_name(name, key)
+
+    def temp_path(self, suffix: str = ".part") -> Path:
+        """A scratch path on the same filesystem, so publishing is a plain rename."""
+        self.root.mkdir(parents=True, exist_ok=True, mode=0o755)
+        return self.root / f"{TEMP_PREFIX}{uuid.uuid4()}{suffix}"
+
+    def get(self, key: str) -> Optional[Path]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        entry[2] = time.time()
+        self._dirty = True
+        return self.root / entry[0]
+
+    def publish(self, key: str, tmp_path: Path, name: str) -> Path:
+        """Move a finished temp file into place as `name` and record it in the index."""
+        final_path = self.path_for(key, name)
+        self._remove(key)  # a key published again may carry a different name
+        final_path.parent.mkdir(exist_ok=True, mode=0o755)
+        os.replace(tmp_path, final_path)
+        final_path.chmod(DEFAULT_FILE_PERM)
+
+        size = final_path.stat().st_size
+        self._entries[key] = [final_path.relative_to(self.root).as_posix(), size, time.time()]
+        self._total += size
+        self._save()
+
+        if self._total > self.max_bytes:
+            self._wake.set()
+        return final_path
+
+    def evict(self) -> int:
+        """Drop expired entries, then least recently used ones until under budget."""
+        now = time.time()
+        removed = 0
+        for key, (_, _, last_access) in sorted(self._entries.items(), key=lambda item: item[1][2]):
+            if now - last_access < EVICT_GRACE:
+                break
+            if now - last_access <= self.max_age and self._total <= self.max_bytes:
+                break
+            self._remove(key)
+            removed += 1
+
+        if removed:
+            self.evicted += removed
+            self._save()
+            logger.info(f"Evicted {removed} cached files, {self._total / 1024 / 1024:.1f} MiB in use")
+        return removed
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._total -= entry[1]
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.get(key)
+        if entry:
+            path = self.root / entry[0]
+            path.unlink(missing_ok=True)
+            if path.parent != self.root:
+                try:
+                    path.parent.rmdir()
+                except OSError:
+                    pass
+            self._drop(key)
+            self._dirty = True
+
+    def load(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True, mode=0o755)
+        for stale in self.root.glob(f"{TEMP_PREFIX}*"):
+            stale.unlink(missing_ok=True)
+
+        try:
+            entries = ujson.loads(self.index_path.read_text())
+        except FileNotFoundError:
+            entries = {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cache index unreadable, starting empty: {e}")
+            entries = {}
+
+        self._entries = {}
+        self._total = 0
+        for key, (name, _, last_access) in entries.items():
+            try:
+                size = (self.root / name).stat().st_size
+            except OSError:
+                continue
+            self._entries[key] = [name, size, last_access]
+            self._total += size
+        self._dirty = len(self._entries) != len(entries)
+
+    def _save(self) -> None:
+        tmp = self.root / f"{TEMP_PREFIX}{INDEX_FILE}"
+        try:
+            tmp.write_text(ujson.dumps(self._entries))
+            os.replace(tmp, self.index_path)
+            self._dirty = False
+        except OSError as e:
+            logger.warning(f"Failed to save cache index: {e}")
+
+    async def start(self) -> None:
+        self.load()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._dirty:
+            self._save()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=EVICT_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            try:
+                self.evict()
+                if self._dirty:
+                    self._save()
+            except Exception as e:
+                logger.warning(f"Cache eviction failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "files": len(self._entries),
+            "bytes": self._total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
+
+
+disk_cache = DiskCache(
+    Path(config.DOWNLOAD_PATH),
+    max_bytes=config.CACHE_MAX_SIZE_MB * 1024 * 1024,
+    max_age=config.CACHE_MAX_AGE_HOURS * 3600,
+)
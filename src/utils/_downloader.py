@@ -1,32 +1,53 @@
 import asyncio
 import binascii
 import logging
+import mimetypes
+import os
 import re
-import shutil
 
 import time
 import uuid
 import zipfile
 from pathlib import Path
 from urllib.parse import urlparse as parse_url
-from typing import Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
+import httpx
 from Crypto.Cipher import AES
 from pytdbot import types
 
 from src import config
 
-from ._api import ApiData, _executor, HttpClient
+from ._api import ApiData, _executor
+from ._http import HttpClient
 from ._dataclass import TrackInfo, PlatformTracks, MusicTrack
+from ._disk_cache import disk_cache
+from ._ogg import build_picture_block, write_tagged_ogg
+from ._ranged import DownloadStatusError, download_to_file
+from ._resilience import resilience
+from ._scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, download_scheduler
+from ._singleflight import SingleFlight
 
 # Constants
 MAX_COVER_SIZE = 10 * 1024 * 1024  # 10MB
 CHUNK_SIZE = 1024 * 1024 * 2  # 2MB
 DEFAULT_FILE_PERM = 0o644
+STORED_SUFFIXES = {".ogg", ".opus", ".mp3", ".m4a", ".aac", ".flac", ".webm", ".mp4"}
+AUDIO_AES_IV = binascii.unhexlify("72e067fbddcbcf77ebe8bc643f630d93")
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# One pipeline per (platform, track) at a time; later callers share its result.
+_inflight = SingleFlight()
+
+# Playlist pipeline stage widths. Downloads are further bounded per platform
+# by the scheduler; remuxing leaves executor threads for interactive requests.
+PLAYLIST_RESOLVE_WORKERS = 4
+PLAYLIST_DOWNLOAD_WORKERS = config.DOWNLOAD_SLOTS
+PLAYLIST_REMUX_WORKERS = 2
+_STAGE_DONE = object()
+
 
 class MissingKeyError(Exception):
     pass
@@ -37,29 +58,37 @@ class InvalidHexKeyError(Exception):
 
 
 class Download:
-    def __init__(self, track: Optional[TrackInfo]):
+    def __init__(self, track: Optional[TrackInfo], priority: int = PRIORITY_INTERACTIVE):
         self.track = track
+        self.priority = priority
         self.downloads_dir = Path(config.DOWNLOAD_PATH)
         self.downloads_dir.mkdir(parents=True, exist_ok=True, mode=0o755)
-        self.output_file = self.downloads_dir / f"{self._sanitize_filename(self.track.name)}.ogg"
+        self.cache_key = disk_cache.make_key(track.platform, track.tc) if track else None
+        self.cover_key = disk_cache.make_key("cover", track.platform, track.tc) if track else None
 
     async def process(self) -> Union[Tuple[str, Optional[str]], types.Error]:
+        """Process the track, sharing the result with concurrent calls for the same track."""
+        return await _inflight.do((self.track.platform, self.track.tc), self._process)
+
+    async def _process(self) -> Union[Tuple[str, Optional[str]], types.Error]:
         """Process the track download with optimized flow."""
         try:
             if not self.track.cdnurl:
                 return types.Error(message="Missing CDN URL")
 
             # Check for existing files first
-            cover_path = self.downloads_dir / f"{self.track.tc}_cover.jpg"
-            if self.output_file.exists():
-                logger.debug(f"Using cached file: {self.output_file}")
-                return str(self.output_file), str(cover_path) if cover_path.exists() else None
+            cached = disk_cache.get(self.cache_key)
+            if cached:
+                logger.debug(f"Using cached file: {cached}")
+                cover_path = disk_cache.get(self.cover_key)
+                return str(cached), str(cover_path) if cover_path else None
 
-            # Process based on platform
-            if self.track.platform in ["youtube", "soundcloud"]:
-                return await self.process_direct_dl()
+            async with download_scheduler.slot(self.track.platform, self.priority):
+                # Process based on platform
+                if self.track.platform in ["youtube", "soundcloud"]:
+                    return await self.process_direct_dl()
 
-            return await self.process_standard()
+                return await self.process_standard()
 
         except Exception as e:
             logger.error(f"Error processing track {self.track.tc}: {str(e)}", exc_info=True)
@@ -71,46 +100,86 @@ class Download:
             cover_path = await self.save_cover(self.track.cover)
             return self.track.cdnurl, cover_path
 
-        file_path = await self.download_file(self.track.cdnurl, "")
+        file_path = await self.download_file(
+            self.track.cdnurl, "", cache_key=self.cache_key, name=self._sanitize_filename(self.track.name)
+        )
+        if isinstance(file_path, types.Error):
+            raise Exception(file_path.message)
         cover_path = await self.save_cover(self.track.cover)
         return file_path, cover_path
 
     async def process_standard(self) -> Tuple[str, Optional[str]]:
         """Optimized standard processing flow."""
         start_time = time.monotonic()
-        if not self.track.key:
-            raise MissingKeyError("Missing CDN key")
-
         try:
-            # Use temporary files in the same directory for atomic writes
-            encrypted_file = self.downloads_dir / f"{uuid.uuid4()}.enc"
-            decrypted_file = self.downloads_dir / f"{uuid.uuid4()}.tmp"
-
+            decrypted_file = await self.fetch_decrypted()
             try:
-                await self.download_and_decrypt(encrypted_file, decrypted_file)
-                await self.rebuild_ogg(decrypted_file)
-                result = await self.vorb_repair_ogg(decrypted_file)
-                self.output_file.chmod(DEFAULT_FILE_PERM)
-                return result
+                return await self.vorb_repair_ogg(decrypted_file)
             finally:
-                encrypted_file.unlink(missing_ok=True)
                 decrypted_file.unlink(missing_ok=True)
         finally:
             logger.info(f"Processed {self.track.tc} in {time.monotonic() - start_time:.2f}s")
 
+    async def fetch_decrypted(self) -> Path:
+        """Download and decrypt into a temp file in the cache directory; the caller removes it."""
+        if not self.track.key:
+            raise MissingKeyError("Missing CDN key")
+
+        # Use temporary files in the cache directory for atomic publishing
+        encrypted_file = disk_cache.temp_path(".enc")
+        decrypted_file = disk_cache.temp_path(".tmp")
+        try:
+            await self.download_and_decrypt(encrypted_file, decrypted_file)
+        except BaseException:
+            decrypted_file.unlink(missing_ok=True)
+            raise
+        finally:
+            encrypted_file.unlink(missing_ok=True)
+        return decrypted_file
+
     async def download_and_decrypt(self, encrypted_path: Path, decrypted_path: Path) -> None:
-        """Optimized download and decrypt pipeline using httpx."""
-        client = await HttpClient.get_client()
+        """Download the encrypted CDN stream and write the decrypted audio to `decrypted_path`."""
+        if config.STREAM_DECRYPT:
+            await self._stream_decrypt(decrypted_path)
+        else:
+            await self._download_then_decrypt(encrypted_path, decrypted_path)
+
+    async def _stream_decrypt(self, decrypted_path: Path) -> None:
+        """Decrypt each chunk as it arrives, without an intermediate .enc file."""
+        client = await HttpClient.get_client("cdn")
+        key = self.track.key
+        self._new_cipher(key)  # fail on a bad key before touching the network
 
         try:
+            await resilience.call(
+                self.track.cdnurl,
+                lambda: download_to_file(
+                    client,
+                    self.track.cdnurl,
+                    decrypted_path,
+                    transform_factory=lambda offset: self._new_cipher(key, offset).decrypt,
+                ),
+            )
+        except Exception as e:
+            decrypted_path.unlink(missing_ok=True)
+            raise e
+
+    async def _download_then_decrypt(self, encrypted_path: Path, decrypted_path: Path) -> None:
+        """Download the whole encrypted file first, then decrypt it in one go."""
+        client = await HttpClient.get_client("cdn")
+
+        async def fetch() -> None:
             async with client.stream('GET', self.track.cdnurl) as response:
                 if response.status_code != 200:
-                    raise Exception(f"Unexpected status code: {response.status_code}")
+                    raise DownloadStatusError(response.status_code)
 
                 with encrypted_path.open('wb') as f:
                     async for chunk in response.aiter_bytes(CHUNK_SIZE):
                         f.write(chunk)
 
+        try:
+            await resilience.call(self.track.cdnurl, fetch)
+
             decrypted_data = await asyncio.get_event_loop().run_in_executor(
                 _executor,
                 self._decrypt_file,
@@ -124,177 +193,138 @@ class Download:
             raise e
 
     @staticmethod
-    def _decrypt_file(file_path: Path, hex_key: str) -> bytes:
+    def _new_cipher(hex_key: str, offset: int = 0):
+        """AES-CTR cipher positioned at byte `offset`, which must be block aligned."""
         try:
             key = binascii.unhexlify(hex_key)
-            audio_aes_iv = binascii.unhexlify("72e067fbddcbcf77ebe8bc643f630d93")
-            cipher = AES.new(key, AES.MODE_CTR, nonce=b'', initial_value=audio_aes_iv)
-
-            with file_path.open('rb') as f:
-                return cipher.decrypt(f.read())
         except binascii.Error as e:
             raise InvalidHexKeyError(f"Invalid hex key: {e}")
+        # CTR keeps its keystream position between calls, so chunks may be any size.
+        counter = (int.from_bytes(AUDIO_AES_IV, "big") + offset // AES.block_size) % (1 << 128)
+        return AES.new(key, AES.MODE_CTR, nonce=b'', initial_value=counter)
 
     @staticmethod
-    async def rebuild_ogg(filename: Path) -> None:
-        """Optimized OGG header rebuilding."""
-        patches = {
-            0: b'OggS',
-            6: b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00',
-            26: b'\x01\x1E\x01vorbis',
-            39: b'\x02',
-            40: b'\x44\xAC\x00\x00',
-            48: b'\x00\xE2\x04\x00',
-            56: b'\xB8\x01',
-            58: b'OggS',
-            62: b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00',
-        }
-
-        # Read-modify-write in one operation
-        with filename.open('r+b') as file:
-            for offset, data in patches.items():
-                file.seek(offset)
-                file.write(data)
+    def _decrypt_file(file_path: Path, hex_key: str) -> bytes:
+        cipher = Download._new_cipher(hex_key)
+        with file_path.open('rb') as f:
+            return cipher.decrypt(f.read())
 
     async def vorb_repair_ogg(self, input_file: Path) -> Tuple[str, Optional[str]]:
-        """Optimized metadata adding with error handling."""
+        """Repair the Spotify header and write all Vorbis comments in one pass."""
         cover_path = await self.save_cover(self.track.cover)
+        loop = asyncio.get_running_loop()
+        # Reading, hashing and encoding the cover is blocking work too.
+        tags = await loop.run_in_executor(_executor, self._vorbis_tags, cover_path)
+        tagged_file = disk_cache.temp_path(".ogg")
         try:
-            await self._run_ffmpeg(input_file, self.output_file)
-            await self._add_vorbis_comments(self.output_file)
+            await loop.run_in_executor(
+                _executor,
+                write_tagged_ogg,
+                input_file,
+                tagged_file,
+                tags
+            )
+            name = self._sanitize_filename(self.track.name) or self.track.tc
+            output_file = disk_cache.publish(self.cache_key, tagged_file, f"{name}.ogg")
         except Exception as e:
-            self.output_file.unlink(missing_ok=True)
+            tagged_file.unlink(missing_ok=True)
             raise e
 
-        return str(self.output_file), cover_path
-
-    async def _run_ffmpeg(self, input_file: Path, output_file: Path) -> None:
-        """Run ffmpeg with optimized parameters."""
-        cmd = [
-            'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
-            '-i', str(input_file),
-            '-c', 'copy',
-            '-metadata', f'lyrics={self.track.lyrics}',
-            str(output_file)
-        ]
-
-        try:
-            proc = await asyncio.create_subprocess_exec(*cmd,
-                                                        stdout=asyncio.subprocess.PIPE,
-                                                        stderr=asyncio.subprocess.PIPE,
-                                                        )
-            _, stderr = await proc.communicate()
-
-            if proc.returncode != 0:
-                raise Exception(f"ffmpeg failed: {stderr.decode()}")
-        except FileNotFoundError:
-            raise Exception("ffmpeg not found in PATH")
-
-    async def _add_vorbis_comments(self, output_file: Path) -> None:
-        """Optimized vorbis comment addition."""
-        if not shutil.which('vorbiscomment'):
-            logger.warning("vorbiscomment not found - skipping metadata")
-            return
-
-        metadata = [
-            f"ALBUM={self.track.album}",
-            f"ARTIST={self.track.artist}",
-            f"TITLE={self.track.name}",
-            f"GENRE=Spotify @FallenProjects",
-            f"YEAR={self.track.year}",
-            f"TRACKNUMBER={self.track.tc}",
-            f"COMMENT=By @FallenProjects",
-            f"PUBLISHER={self.track.artist}",
-            f"DURATION={self.track.duration}",
+        return str(output_file), cover_path
+
+    def _vorbis_tags(self, cover_path: Optional[str]) -> List[Tuple[str, str]]:
+        tags = [
+            ("ALBUM", self.track.album),
+            ("ARTIST", self.track.artist),
+            ("TITLE", self.track.name),
+            ("GENRE", "Spotify @FallenProjects"),
+            ("YEAR", str(self.track.year)),
+            ("TRACKNUMBER", self.track.tc),
+            ("COMMENT", "By @FallenProjects"),
+            ("PUBLISHER", self.track.artist),
+            ("DURATION", str(self.track.duration)),
         ]
-        metadata.insert(0, f"METADATA_BLOCK_PICTURE={await self._create_vorbis_image_block()}")
-        tmp_file = self.downloads_dir / f"{uuid.uuid4()}.txt"
-        try:
-            tmp_file.write_text("\n".join(metadata))
-
-            cmd = ['vorbiscomment', '-a', str(output_file), '-c', str(tmp_file)]
-            proc = await asyncio.create_subprocess_exec(*cmd,
-                                                        stdout=asyncio.subprocess.PIPE,
-                                                        stderr=asyncio.subprocess.PIPE,
-                                                        )
-            _, stderr = await proc.communicate()
-
-            if proc.returncode != 0:
-                raise Exception(f"vorbiscomment failed: {stderr.decode()}")
-        finally:
-            tmp_file.unlink(missing_ok=True)
+        picture = self._create_vorbis_image_block(cover_path)
+        if picture:
+            tags.insert(0, ("METADATA_BLOCK_PICTURE", picture))
+        if self.track.lyrics:
+            tags.append(("LYRICS", self.track.lyrics))
+        return tags
 
-    async def _create_vorbis_image_block(self) -> str:
-        path = await self.save_cover(self.track.cover)
-        if not path:
+    @staticmethod
+    def _create_vorbis_image_block(cover_path: Optional[str]) -> str:
+        if not cover_path:
             return ""
 
-        image_path = Path(path)
-        base64_path = image_path.with_suffix(".base64")
-
         try:
-            process = await asyncio.create_subprocess_exec(
-                "./cover_gen.sh", str(image_path),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-            stdout, stderr = await process.communicate()
-
-            if process.returncode != 0:
-                logging.error(f"cover_gen.sh failed with code {process.returncode}\nOutput: {stderr.decode().strip()}")
-                return ""
-
-            if not base64_path.exists():
-                logging.error(f"{base64_path} not generated by cover_gen.sh")
-                return ""
-
-            return base64_path.read_text()
-
+            return build_picture_block(Path(cover_path).read_bytes())
         except Exception as e:
-            logging.error(f"Error generating vorbis block: {e}")
+            logger.error(f"Error generating vorbis block: {e}")
             return ""
-        finally:
-            base64_path.unlink(missing_ok=True)
 
-    async def download_file(self, url: str, file_path: str = "") -> str | types.Error:
+    async def download_file(
+        self, url: str, file_path: str = "", cache_key: Optional[str] = None, name: str = ""
+    ) -> str | types.Error:
+        """
+        Download `url` to `file_path`, or into the disk cache when no path is given.
+
+        Cached downloads are keyed by `cache_key`, falling back to the URL, and
+        stored as `name` (or the URL's file name) with the file's extension.
+        """
         if not url:
             return types.Error(code=400, message="No URL provided")
 
-        file_path = Path(file_path) if file_path else self._generate_filename(url)
-
-        if file_path.exists():
-            return str(file_path)
+        target = Path(file_path) if file_path else None
+        if target:
+            if target.exists():
+                return str(target)
+        else:
+            cache_key = cache_key or disk_cache.make_key("url", url)
+            cached = disk_cache.get(cache_key)
+            if cached:
+                return str(cached)
 
-        client = await HttpClient.get_client()
+        client = await HttpClient.get_client("media")
+        tmp_path = disk_cache.temp_path()
 
         try:
-            async with client.stream("GET", url, follow_redirects=True) as response:
-                if response.status_code != 200:
-                    return types.Error(
-                        code=response.status_code,
-                        message=f"Unexpected status code: {response.status_code}"
-                    )
+            headers = await download_to_file(client, url, tmp_path)
 
-                with file_path.open("wb") as f:
-                    async for chunk in response.aiter_bytes(CHUNK_SIZE):
-                        f.write(chunk)
-
-            file_path.chmod(DEFAULT_FILE_PERM)
-            return str(file_path)
+            if target:
+                os.replace(tmp_path, target)
+                target.chmod(DEFAULT_FILE_PERM)
+                return str(target)
+            return str(disk_cache.publish(cache_key, tmp_path, self._file_name(url, name, headers)))
 
+        except DownloadStatusError as e:
+            return types.Error(code=e.status_code, message=str(e))
         except Exception as e:
-            file_path.unlink(missing_ok=True)
             return types.Error(code=500, message=f"Download failed: {str(e)}")
+        finally:
+            tmp_path.unlink(missing_ok=True)
 
-    def _generate_filename(self, url: str) -> Path:
-        """Generate a safe filename from URL."""
+    @staticmethod
+    def _url_suffix(url: str) -> str:
+        """File extension of the URL path, if it looks like one."""
         try:
-            filename = Path(parse_url(url).path).name
-            if not filename or filename == '/':
-                filename = f"{uuid.uuid4()}.tmp"
-            return self.downloads_dir / self._sanitize_filename(filename)
-        except Exception:
-            return self.downloads_dir / f"{uuid.uuid4()}.tmp"
+            suffix = Path(parse_url(url).path).suffix
+        except ValueError:
+            return ""
+        return suffix if re.fullmatch(r'\.[A-Za-z0-9]{1,5}', suffix) else ""
+
+    @classmethod
+    def _file_name(cls, url: str, name: str, headers: httpx.Headers) -> str:
+        """`name` (or the URL's file name) with an extension from the URL, else from the Content-Type."""
+        suffix = cls._url_suffix(url)
+        content_type = headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if not suffix and content_type and content_type != "application/octet-stream":
+            suffix = mimetypes.guess_extension(content_type) or ""
+        if not name:
+            try:
+                name = cls._sanitize_filename(Path(parse_url(url).path).stem)
+            except ValueError:
+                name = ""
+        return f"{name or 'file'}{suffix}"
 
     @staticmethod
     def _sanitize_filename(name: str) -> str:
@@ -313,12 +343,12 @@ class Download:
         if not cover_url:
             return None
 
-        cover_path = self.downloads_dir / f"{self.track.tc}_cover.jpg"
-        if cover_path.exists():
+        cover_path = disk_cache.get(self.cover_key)
+        if cover_path:
             return str(cover_path)
 
         try:
-            client = await HttpClient.get_client()
+            client = await HttpClient.get_client("cover")
             response = await client.get(cover_url)
             if response.status_code != 200:
                 return None
@@ -328,61 +358,256 @@ class Download:
                 logger.warning(f"Cover too large ({len(cover_data)} bytes)")
                 return None
 
-            cover_path.write_bytes(cover_data)
-            cover_path.chmod(DEFAULT_FILE_PERM)
-            return str(cover_path)
+            tmp_path = disk_cache.temp_path(".jpg")
+            try:
+                tmp_path.write_bytes(cover_data)
+                return str(disk_cache.publish(self.cover_key, tmp_path, "cover.jpg"))
+            finally:
+                tmp_path.unlink(missing_ok=True)
         except Exception as e:
             logger.warning(f"Failed to download cover: {e}")
             return None
 
 
-async def download_playlist_zip(playlist: PlatformTracks) -> Optional[str]:
-    """Optimized playlist download with parallel processing."""
-    downloads_dir = Path(config.DOWNLOAD_PATH)
-    zip_path = downloads_dir / f"playlist_{int(time.time())}.zip"
-    temp_dir = downloads_dir / f"tmp_{uuid.uuid4()}"
-    temp_dir.mkdir(parents=True, exist_ok=True)
+class _ZipStreamWriter:
+    """
+    Appends files to a ZIP64-capable archive as they become ready.
 
-    try:
-        tasks = []
-        for music in playlist.results:
-            tasks.append(_process_playlist_track(music, temp_dir))
+    Writes run on the shared executor one at a time, so the event loop never
+    does archive IO. Audio is stored as-is; deflating Ogg/MP3 buys nothing.
+    """
 
-        audio_files = await asyncio.gather(*tasks, return_exceptions=True)
-        audio_files = [f for f in audio_files if isinstance(f, Path)]
+    def __init__(self, path: Path):
+        self.path = path
+        self.count = 0
+        self._zip = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+        self._lock = asyncio.Lock()
+        self._names = set()
 
-        if not audio_files:
-            return None
+    async def add(self, file: Path, name: str) -> None:
+        arcname = _unique_name(name, self._names)
+        async with self._lock:
+            await asyncio.get_running_loop().run_in_executor(_executor, self._write, file, arcname)
+        self.count += 1
+
+    def _write(self, file: Path, arcname: str) -> None:
+        compress_type = zipfile.ZIP_STORED if file.suffix.lower() in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+        self._zip.write(file, arcname=arcname, compress_type=compress_type)
 
-        temp_zip = downloads_dir / f"tmp_{uuid.uuid4()}.zip"
-        with zipfile.ZipFile(temp_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file in audio_files:
-                zipf.write(file, arcname=file.name)
+    async def close(self) -> None:
+        async with self._lock:
+            await asyncio.get_running_loop().run_in_executor(_executor, self._zip.close)
 
-        temp_zip.rename(zip_path)
-        return str(zip_path)
-    finally:
-        for file in temp_dir.glob('*'):
-            file.unlink(missing_ok=True)
 
+async def download_playlist_zip(playlist: PlatformTracks) -> Optional[Tuple[str, int]]:
+    """
+    Run the playlist through the staged pipeline, adding each track to the archive as soon as it is ready.
 
-async def _process_playlist_track(music: MusicTrack, temp_dir: Path) -> Optional[Path]:
-    """Process a single playlist track."""
+    Returns the archive path and the number of tracks in it, or None if no track could be added.
+    """
+    zip_path = disk_cache.temp_path(".zip")
+    writer = _ZipStreamWriter(zip_path)
     try:
-        track = await ApiData(music.url).get_track()
+        try:
+            await _PlaylistPipeline(writer).run(playlist.results)
+        finally:
+            await writer.close()
+    except BaseException:
+        zip_path.unlink(missing_ok=True)
+        raise
+
+    if not writer.count:
+        zip_path.unlink(missing_ok=True)
+        return None
+    # Indexed like any other download, so the archive is evicted once it goes unused.
+    key = disk_cache.make_key("playlist", uuid.uuid4().hex)
+    return str(disk_cache.publish(key, zip_path, f"Playlist ({writer.count} tracks).zip")), writer.count
+
+
+class _PlaylistPipeline:
+    """
+    Moves playlist tracks through three bounded stages:
+
+    resolve (get_track) -> download and decrypt -> tag and remux on the executor.
+
+    Each stage has its own worker count, and the queues between them are
+    bounded, so a fast stage waits for a slow one instead of piling up
+    metadata with expiring CDN URLs or decrypted temp files. Tracks that are
+    already cached, or that are direct downloads, skip straight to the archive.
+
+    A track taking the staged path is registered in `_inflight` until it is
+    remuxed, so a `Download.process` call for it waits for the pipeline
+    instead of downloading it again.
+    """
+
+    def __init__(self, writer: _ZipStreamWriter):
+        self.writer = writer
+        self.resolve_queue: asyncio.Queue = asyncio.Queue(maxsize=PLAYLIST_RESOLVE_WORKERS * 2)
+        self.download_queue: asyncio.Queue = asyncio.Queue(maxsize=PLAYLIST_DOWNLOAD_WORKERS * 2)
+        self.remux_queue: asyncio.Queue = asyncio.Queue(maxsize=PLAYLIST_REMUX_WORKERS)
+        self.done_queue: asyncio.Queue = asyncio.Queue(maxsize=PLAYLIST_REMUX_WORKERS * 2)
+        self.stage_time = {"resolve": 0.0, "download": 0.0, "remux": 0.0}
+        self._staged: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    async def run(self, tracks: List[MusicTrack]) -> None:
+        started = time.monotonic()
+        stages = [
+            asyncio.create_task(self._feed(tracks)),
+            asyncio.create_task(self._stage(
+                self.resolve_queue, PLAYLIST_RESOLVE_WORKERS, self._resolve,
+                self.download_queue, PLAYLIST_DOWNLOAD_WORKERS,
+            )),
+            asyncio.create_task(self._stage(
+                self.download_queue, PLAYLIST_DOWNLOAD_WORKERS, self._download,
+                self.remux_queue, PLAYLIST_REMUX_WORKERS,
+            )),
+            asyncio.create_task(self._stage(
+                self.remux_queue, PLAYLIST_REMUX_WORKERS, self._remux,
+                self.done_queue, 1,
+            )),
+        ]
+        try:
+            while (item := await self.done_queue.get()) is not _STAGE_DONE:
+                # Tracks stay in the disk cache; they are only named after the song inside the archive.
+                file, name = item
+                try:
+                    await self.writer.add(file, f"{Download._sanitize_filename(name) or file.stem}{file.suffix}")
+                except Exception as e:
+                    # e.g. the cached file was evicted after it was found; the rest of the archive is still good.
+                    logger.warning(f"Failed to add {file} to the playlist archive: {e}")
+            await asyncio.gather(*stages)
+        finally:
+            for task in stages:
+                task.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            self._discard_pending()
+            for key in list(self._staged):
+                self._finish(key, types.Error(message="Playlist download was cancelled"))
+
+        timings = ", ".join(f"{name} {spent:.1f}s" for name, spent in self.stage_time.items())
+        logger.info(
+            f"Playlist: {self.writer.count}/{len(tracks)} tracks in {time.monotonic() - started:.1f}s "
+            f"(worker time: {timings})"
+        )
+
+    async def _feed(self, tracks: List[MusicTrack]) -> None:
+        for music in tracks:
+            await self.resolve_queue.put(music)
+        for _ in range(PLAYLIST_RESOLVE_WORKERS):
+            await self.resolve_queue.put(_STAGE_DONE)
+
+    @staticmethod
+    async def _stage(inbox: asyncio.Queue, workers: int, handle, outbox: asyncio.Queue, next_workers: int) -> None:
+        """Run `workers` copies of `handle` until each sees the end marker, then pass it on."""
+
+        async def worker() -> None:
+            while (item := await inbox.get()) is not _STAGE_DONE:
+                try:
+                    await handle(item)
+                except Exception as e:
+                    logger.warning(f"Playlist stage {handle.__name__} failed: {e}")
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        for _ in range(next_workers):
+            await outbox.put(_STAGE_DONE)
+
+    async def _resolve(self, music: MusicTrack) -> None:
+        started = time.monotonic()
+        try:
+            track = await ApiData(music.url).get_track()
+        finally:
+            self.stage_time["resolve"] += time.monotonic() - started
         if isinstance(track, types.Error):
-            return None
+            logger.warning(f"Failed to resolve {music.url}: {track.message}")
+            return
+        await self.download_queue.put(Download(track, priority=PRIORITY_BULK))
 
-        dl = Download(track)
-        result = await dl.process()
-        if isinstance(result, types.Error):
-            return None
+    async def _download(self, dl: Download) -> None:
+        started = time.monotonic()
+        try:
+            cached = disk_cache.get(dl.cache_key)
+            if cached:
+                await self.done_queue.put((cached, dl.track.name))
+                return
+
+            # Direct downloads have nothing to remux, and a track someone else is
+            # already fetching is simply shared.
+            key = (dl.track.platform, dl.track.tc)
+            if dl.track.platform in ["youtube", "soundcloud"] or _inflight.running(key):
+                result = await dl.process()
+                if isinstance(result, types.Error):
+                    logger.warning(f"Failed to download {dl.track.tc}: {result.message}")
+                    return
+                file = Path(result[0])
+                if not file.is_file():
+                    # e.g. a t.me link, which Telegram resolves itself but a ZIP cannot hold.
+                    logger.warning(f"Skipping {dl.track.tc}: {result[0]} is not a local file")
+                    return
+                await self.done_queue.put((file, dl.track.name))
+                return
+
+            if not dl.track.cdnurl:
+                logger.warning(f"Missing CDN URL for {dl.track.tc}")
+                return
+            self._stage_track(key)
+            try:
+                async with download_scheduler.slot(dl.track.platform, dl.priority):
+                    decrypted = await dl.fetch_decrypted()
+            except Exception as e:
+                self._finish(key, types.Error(message=f"Track processing failed: {e}"))
+                raise
+        finally:
+            self.stage_time["download"] += time.monotonic() - started
 
-        audio_file, _ = result
-        src_path = Path(audio_file)
-        dest_path = temp_dir / src_path.name
-        src_path.rename(dest_path)
-        return dest_path
-    except Exception as e:
-        logger.warning(f"Failed to process track {music.url}: {e}")
-        return None
+        try:
+            await self.remux_queue.put((dl, decrypted))
+        except BaseException:
+            decrypted.unlink(missing_ok=True)
+            raise
+
+    async def _remux(self, item: Tuple[Download, Path]) -> None:
+        dl, decrypted = item
+        key = (dl.track.platform, dl.track.tc)
+        started = time.monotonic()
+        try:
+            result = await dl.vorb_repair_ogg(decrypted)
+        except Exception as e:
+            self._finish(key, types.Error(message=f"Track processing failed: {e}"))
+            raise
+        finally:
+            decrypted.unlink(missing_ok=True)
+            self.stage_time["remux"] += time.monotonic() - started
+        self._finish(key, result)
+        await self.done_queue.put((Path(result[0]), dl.track.name))
+
+    def _stage_track(self, key: Tuple[str, str]) -> None:
+        """Register a staged track in `_inflight`, so `Download.process` joins it until `_finish`."""
+        future = asyncio.get_running_loop().create_future()
+        self._staged[key] = future
+
+        async def staged() -> Union[Tuple[str, Optional[str]], types.Error]:
+            return await future
+
+        _inflight.start(key, staged)
+
+    def _finish(self, key: Tuple[str, str], result: Union[Tuple[str, Optional[str]], types.Error]) -> None:
+        future = self._staged.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    def _discard_pending(self) -> None:
+        """Remove decrypted temp files still queued when the pipeline is cancelled."""
+        while not self.remux_queue.empty():
+            item = self.remux_queue.get_nowait()
+            if item is not _STAGE_DONE:
+                item[1].unlink(missing_ok=True)
+
+
+def _unique_name(name: str, used: set) -> str:
+    stem, suffix = Path(name).stem, Path(name).suffix
+    candidate, counter = name, 1
+    while candidate in used:
+        counter += 1
+        candidate = f"{stem} ({counter}){suffix}"
+    used.add(candidate)
+    return candidate
@@ -2,7 +2,10 @@ import re
 from typing import Union, Optional, Pattern, Set
 
 from pytdbot import filters, types
-from src.utils._api import ApiData
+from src.utils._router import KIND_SNAP, KIND_TRACK, url_router
+
+COMMAND_PATTERN: Pattern = re.compile(r"^[!/]\w+(?:@\w+)?", re.IGNORECASE)
+URL_PREFIX: Pattern = re.compile(r"^https?://")
 
 
 class Filter:
@@ -85,13 +88,12 @@ class Filter:
         Returns:
             Filter that matches valid Snapchat URLs and excludes commands
         """
-        command_pattern: Pattern = re.compile(r"^[!/]\w+(?:@\w+)?", re.IGNORECASE)
-
         async def filter_func(_, event) -> bool:
             text = Filter._extract_text(event)
-            if not text or command_pattern.match(text.strip()):
+            if not text or COMMAND_PATTERN.match(text.strip()):
                 return False
-            return ApiData(text).is_save_snap_url()
+            route = url_router.classify_event(event, text)
+            return route is not None and route.kind == KIND_SNAP
 
         return filters.create(filter_func)
 
@@ -103,11 +105,9 @@ class Filter:
         Returns:
             Filter that matches valid URLs and handles private/group chat logic
         """
-        command_pattern: Pattern = re.compile(r"^[!/]\w+(?:@\w+)?", re.IGNORECASE)
-
         async def filter_func(client, event) -> bool:
             text = Filter._extract_text(event)
-            if not text or command_pattern.match(text.strip()):
+            if not text or COMMAND_PATTERN.match(text.strip()):
                 return False
 
             chat_id: Optional[int] = None
@@ -123,10 +123,11 @@ class Filter:
             if chat_id is None:
                 return False
 
-            if ApiData(text).is_valid():
+            route = url_router.classify_event(event, text)
+            if route is not None and route.kind == KIND_TRACK:
                 return True
 
-            if re.match("^https?://", text):
+            if URL_PREFIX.match(text):
                 return False
 
             return chat_id > 0
@@ -0,0 +1,94 @@
+import html
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+from pytdbot import types
+
+# The subset of Telegram HTML our messages use.
+ENTITY_TAGS = {
+    "b": types.TextEntityTypeBold,
+    "strong": types.TextEntityTypeBold,
+    "i": types.TextEntityTypeItalic,
+    "em": types.TextEntityTypeItalic,
+    "u": types.TextEntityTypeUnderline,
+    "ins": types.TextEntityTypeUnderline,
+    "s": types.TextEntityTypeStrikethrough,
+    "strike": types.TextEntityTypeStrikethrough,
+    "del": types.TextEntityTypeStrikethrough,
+    "code": types.TextEntityTypeCode,
+    "pre": types.TextEntityTypePre,
+    "a": types.TextEntityTypeTextUrl,
+}
+MARKUP_TAG = re.compile(r"</?(?:%s)\b[^>]*>" % "|".join(ENTITY_TAGS), re.IGNORECASE)
+
+
+class HTMLFormatError(ValueError):
+    pass
+
+
+def utf16_length(text: str) -> int:
+    """Telegram entity offsets count UTF-16 code units, so astral characters (emoji) count twice."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+class _EntityParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._parts: List[str] = []
+        self._utf16_offset = 0
+        self._entities: List[types.TextEntity] = []
+        self._open: List[Tuple[str, int, Dict[str, Optional[str]]]] = []
+
+    def handle_starttag(self, tag: str, attrs) -> None:
+        if tag not in ENTITY_TAGS:
+            raise HTMLFormatError(f"Unsupported start tag <{tag}>")
+        self._open.append((tag, self._utf16_offset, dict(attrs)))
+
+    def handle_startendtag(self, tag: str, attrs) -> None:
+        raise HTMLFormatError(f"Unsupported self-closing tag <{tag}/>")
+
+    def handle_endtag(self, tag: str) -> None:
+        if not self._open or self._open[-1][0] != tag:
+            raise HTMLFormatError(f"Unmatched end tag </{tag}>")
+        tag, start, attrs = self._open.pop()
+        length = self._utf16_offset - start
+        if length <= 0:
+            return
+
+        if tag == "a":
+            url = (attrs.get("href") or "").strip()
+            if not url:
+                return
+            entity_type = types.TextEntityTypeTextUrl(url=url)
+        else:
+            entity_type = ENTITY_TAGS[tag]()
+        self._entities.append(types.TextEntity(offset=start, length=length, type=entity_type))
+
+    def handle_data(self, data: str) -> None:
+        self._parts.append(data)
+        self._utf16_offset += utf16_length(data)
+
+    def result(self) -> types.FormattedText:
+        self.close()
+        if self._open:
+            raise HTMLFormatError(f"Unclosed tag <{self._open[-1][0]}>")
+        # Same order TDLib returns: by offset, outer entities first.
+        self._entities.sort(key=lambda entity: (entity.offset, -entity.length))
+        return types.FormattedText(text="".join(self._parts), entities=self._entities)
+
+
+def format_html(text: str) -> types.FormattedText:
+    """
+    Parse Telegram-style HTML locally, without a TDLib `parseTextEntities` round-trip.
+
+    Values interpolated into markup must be escaped with `html.escape`.
+    Text that is still not valid for the supported subset is sent with its
+    formatting tags stripped instead of failing.
+    """
+    parser = _EntityParser()
+    try:
+        parser.feed(text)
+        return parser.result()
+    except HTMLFormatError:
+        return types.FormattedText(text=html.unescape(MARKUP_TAG.sub("", text)), entities=[])
@@ -0,0 +1,97 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+LATENCY_WINDOW = 200  # recent primary latencies the percentile is taken over
+MIN_SAMPLES = 20  # no hedging until the window says something
+MIN_HEDGE_DELAY = 0.05  # seconds; never hedge a request that has barely started
+MAX_BUDGET_TOKENS = 10.0
+_NO_RESULT = object()
+
+
+class Hedger:
+    """
+    Sends a duplicate request when the first one is slower than most recent ones.
+
+    The hedge fires once the primary has run longer than the configured
+    percentile of recent latencies. Whichever attempt returns an accepted
+    result first wins and the other is cancelled. Every request earns
+    `budget` tokens and every hedge spends one, so hedges stay a small
+    share of traffic even while the upstream is slow.
+    """
+
+    def __init__(self, percentile: float, budget: float):
+        self.percentile = percentile
+        self.budget = budget
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._tokens = 0.0
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def delay(self) -> Optional[float]:
+        if len(self._latencies) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(int(len(ordered) * self.percentile / 100), len(ordered) - 1)
+        return max(ordered[index], MIN_HEDGE_DELAY)
+
+    def _take_token(self) -> bool:
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def run(self, func: Callable[[], Awaitable[T]], accept: Callable[[T], bool] = lambda _: True) -> T:
+        self.requests += 1
+        self._tokens = min(self._tokens + self.budget, MAX_BUDGET_TOKENS)
+
+        started = time.monotonic()
+        primary = asyncio.create_task(func())
+        hedge: Optional[asyncio.Task] = None
+        try:
+            delay = self.delay()
+            if delay is not None:
+                await asyncio.wait({primary}, timeout=delay)
+                if not primary.done() and self._take_token():
+                    self.hedged += 1
+                    hedge = asyncio.create_task(func())
+
+            # A primary that finished within the delay is picked up on the first pass.
+            pending = {task for task in (primary, hedge) if task is not None}
+            result, error = _NO_RESULT, None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Prefer the primary when both finished in the same tick.
+                for task in sorted(done, key=lambda t: t is not primary):
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    result = task.result()
+                    if accept(result):
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return result
+
+            # Nothing acceptable: the last answer if there was one, else the first failure.
+            if result is _NO_RESULT:
+                raise error
+            return result
+        finally:
+            # A primary cut short by its hedge still tells us it was at least this slow.
+            self._latencies.append(time.monotonic() - started)
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, object]:
+        delay = self.delay()
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_after_ms": round(delay * 1000) if delay is not None else "warming up",
+        }
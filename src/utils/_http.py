@@ -0,0 +1,168 @@
+import importlib.util
+import logging
+import time
+from typing import Dict, NamedTuple, Optional
+
+import httpx
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+
+class ClientProfile(NamedTuple):
+    timeout: httpx.Timeout
+    limits: httpx.Limits
+    http2: bool = False
+
+
+# One pool per kind of traffic, so long CDN streams never hold the
+# connections that small API calls and cover fetches need.
+CLIENT_PROFILES: Dict[str, ClientProfile] = {
+    # Small JSON calls: fail fast, many keep-alive connections to one host.
+    "api": ClientProfile(
+        timeout=httpx.Timeout(connect=10.0, read=30.0, write=10.0, pool=10.0),
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0),
+        http2=config.API_HTTP2,
+    ),
+    # Encrypted audio streams, several Range requests per track.
+    "cdn": ClientProfile(
+        timeout=httpx.Timeout(connect=30.0, read=300.0, write=30.0, pool=60.0),
+        limits=httpx.Limits(
+            max_connections=config.DOWNLOAD_SLOTS * max(config.SEGMENTED_DOWNLOADS, 1) * 2,
+            max_keepalive_connections=8,
+            keepalive_expiry=30.0,
+        ),
+    ),
+    # Cover art: tiny responses, a missing cover is not worth waiting for.
+    "cover": ClientProfile(
+        timeout=httpx.Timeout(connect=5.0, read=15.0, write=5.0, pool=5.0),
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=30.0),
+    ),
+    # Direct downloads and snap media from arbitrary hosts.
+    "media": ClientProfile(
+        timeout=httpx.Timeout(connect=30.0, read=300.0, write=30.0, pool=120.0),
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=4, keepalive_expiry=15.0),
+    ),
+    # Range reads of snap video headers: a few KB each, ffprobe takes over if they stall.
+    "probe": ClientProfile(
+        timeout=httpx.Timeout(connect=5.0, read=10.0, write=5.0, pool=10.0),
+        limits=httpx.Limits(
+            max_connections=config.PROBE_CONCURRENCY * 2, max_keepalive_connections=4, keepalive_expiry=15.0
+        ),
+    ),
+}
+
+
+class PoolStats:
+    """How long requests waited for a free connection in one client's pool."""
+
+    def __init__(self):
+        self.requests = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.in_flight = 0
+
+    def record(self, wait: float) -> None:
+        self.requests += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "avg_wait_ms": round(self.wait_total / self.requests * 1000, 1) if self.requests else 0,
+            "max_wait_ms": round(self.wait_max * 1000, 1),
+            "pool_timeouts": self.timeouts,
+        }
+
+
+class PoolTimingTransport(httpx.AsyncHTTPTransport):
+    """
+    Measures pool wait with the httpcore `trace` extension.
+
+    The first trace event of a request (connecting, or sending headers on a
+    reused connection) only fires once the pool has handed out a connection.
+    """
+
+    def __init__(self, stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        acquired = False
+        inner_trace = request.extensions.get("trace")
+
+        async def trace(event: str, info: dict) -> None:
+            nonlocal acquired
+            if not acquired:
+                acquired = True
+                self.stats.record(time.monotonic() - started)
+            if inner_trace is not None:
+                await inner_trace(event, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        self.stats.in_flight += 1
+        try:
+            return await super().handle_async_request(request)
+        except httpx.PoolTimeout:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.in_flight -= 1
+
+
+def _h2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class HttpClient:
+    """Named, lazily created httpx clients: `api`, `cdn`, `cover` and `media`."""
+
+    _clients: Dict[str, httpx.AsyncClient] = {}
+    _stats: Dict[str, PoolStats] = {}
+
+    @staticmethod
+    async def get_client(name: str = "api") -> httpx.AsyncClient:
+        client = HttpClient._clients.get(name)
+        if client is None or client.is_closed:
+            client = HttpClient._clients[name] = HttpClient._create(name)
+        return client
+
+    @staticmethod
+    def _create(name: str) -> httpx.AsyncClient:
+        profile = CLIENT_PROFILES[name]
+        http2 = profile.http2
+        if http2 and not _h2_available():
+            logger.warning(f"HTTP/2 requested for the {name} client but h2 is not installed (pip install httpx[http2]), using HTTP/1.1")
+            http2 = False
+
+        stats = HttpClient._stats.setdefault(name, PoolStats())
+        transport = PoolTimingTransport(
+            stats,
+            http2=http2,
+            limits=profile.limits,
+            trust_env=True,
+        )
+        return httpx.AsyncClient(
+            transport=transport,
+            timeout=profile.timeout,
+            limits=profile.limits,
+            follow_redirects=True,
+            trust_env=True,
+        )
+
+    @staticmethod
+    async def close_client(name: Optional[str] = None) -> None:
+        names = [name] if name else list(HttpClient._clients)
+        for client_name in names:
+            client = HttpClient._clients.pop(client_name, None)
+            if client is not None:
+                await client.aclose()
+
+    @staticmethod
+    def stats() -> Dict[str, Dict[str, object]]:
+        return {name: stats.as_dict() for name, stats in HttpClient._stats.items()}
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Coroutine, Dict, List, Optional
+
+from ._dataclass import MusicTrack
+
+logger = logging.getLogger(__name__)
+
+MAX_SESSIONS = 5000
+QUERIES_PER_SESSION = 8
+SESSION_TTL = 300  # seconds; a typing session is short-lived
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class _Session:
+    __slots__ = ("task", "results", "touched")
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        # normalized query -> results, most recent last
+        self.results: "OrderedDict[str, List[MusicTrack]]" = OrderedDict()
+        self.touched = time.monotonic()
+
+
+class InlineSessions:
+    """
+    Per-user state for inline mode while someone is typing.
+
+    Each user has at most one inline query being worked on: a newer
+    keystroke cancels the previous one. Recent results are indexed by query,
+    so `@bot aria` can be answered by filtering what `@bot ari` returned while
+    the real search is still running.
+    """
+
+    def __init__(self):
+        self._sessions: "OrderedDict[int, _Session]" = OrderedDict()
+        self.submitted = 0
+        self.superseded = 0
+        self.prefix_matches_found = 0
+
+    def _session(self, user_id: int) -> _Session:
+        session = self._sessions.get(user_id)
+        now = time.monotonic()
+        if session is None or now - session.touched > SESSION_TTL:
+            if session is not None and session.task is not None:
+                session.task.cancel()
+            session = self._sessions[user_id] = _Session()
+        session.touched = now
+        self._sessions.move_to_end(user_id)
+        while len(self._sessions) > MAX_SESSIONS:
+            _, evicted = self._sessions.popitem(last=False)
+            if evicted.task is not None:
+                evicted.task.cancel()
+        return session
+
+    def submit(self, user_id: int, coro: Coroutine) -> asyncio.Task:
+        """
+        Run `coro` as this user's current inline query, cancelling the one it supersedes.
+
+        The work runs in its own task so update workers are never blocked on
+        (or cancelled with) a search.
+        """
+        session = self._session(user_id)
+        if session.task is not None and not session.task.done():
+            session.task.cancel()
+            self.superseded += 1
+
+        task = asyncio.create_task(coro)
+        session.task = task
+        task.add_done_callback(lambda t: self._done(user_id, t))
+        self.submitted += 1
+        return task
+
+    def _done(self, user_id: int, task: asyncio.Task) -> None:
+        session = self._sessions.get(user_id)
+        if session is not None and session.task is task:
+            session.task = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Inline query failed", exc_info=task.exception())
+
+    def remember(self, user_id: int, query: str, tracks: List[MusicTrack]) -> None:
+        session = self._session(user_id)
+        key = normalize_query(query)
+        session.results[key] = tracks
+        session.results.move_to_end(key)
+        while len(session.results) > QUERIES_PER_SESSION:
+            session.results.popitem(last=False)
+
+    def prefix_matches(self, user_id: int, query: str) -> Optional[List[MusicTrack]]:
+        """Filter the results of the longest earlier query that `query` extends."""
+        session = self._sessions.get(user_id)
+        if session is None or time.monotonic() - session.touched > SESSION_TTL:
+            return None
+
+        key = normalize_query(query)
+        prefix = max(
+            (cached for cached in session.results if len(cached) < len(key) and key.startswith(cached)),
+            key=len,
+            default=None,
+        )
+        if prefix is None:
+            return None
+
+        words = key.split()
+        matches = [
+            track for track in session.results[prefix]
+            if all(word in f"{track.name} {track.artist}".lower() for word in words)
+        ]
+        if matches:
+            self.prefix_matches_found += 1
+        return matches or None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._sessions),
+            "queries": self.submitted,
+            "superseded": self.superseded,
+            "prefix_matches": self.prefix_matches_found,
+        }
+
+
+inline_sessions = InlineSessions()
@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import struct
+import urllib.parse
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from src import config
+
+from ._cache import TTLCache
+from ._http import HttpClient
+from ._singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+PROBE_CACHE_SIZE = 2000
+PROBE_CACHE_TTL = 6 * 3600
+FFPROBE_TIMEOUT = 10
+HEAD_BYTES = 64 * 1024  # first read; holds the whole `moov` of a faststart file
+MAX_MOOV_BYTES = 4 * 1024 * 1024  # larger than any short clip's index
+MAX_RANGE_FETCHES = 3
+PROBE_HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+# Query parameters that sign or expire a CDN URL without changing the media it points at.
+VOLATILE_PARAMS = {
+    "oh", "oe", "efg", "ccb", "ohc", "edm", "expires", "expire", "signature", "sig",
+    "x-expires", "x-signature", "policy", "key-pair-id", "token", "l", "dl",
+}
+VOLATILE_PREFIXES = ("_nc_", "x-amz-")
+
+# Boxes whose children lead from `moov` to a track's handler type.
+CONTAINER_PATH = {b"moov": b"trak", b"trak": b"mdia", b"mdia": b"hdlr"}
+
+
+class NotMP4(Exception):
+    """The probed bytes are not an MP4 we can read; ffprobe decides instead."""
+
+
+def canonical_media_url(url: str) -> str:
+    """Drop signature and expiry parameters so re-signed links to the same file share a key."""
+    try:
+        parsed = urllib.parse.urlsplit(url)
+    except ValueError:
+        return url
+    query = sorted(
+        (name, value) for name, value in urllib.parse.parse_qsl(parsed.query, keep_blank_values=True)
+        if name.lower() not in VOLATILE_PARAMS and not name.lower().startswith(VOLATILE_PREFIXES)
+    )
+    return urllib.parse.urlunsplit(
+        (parsed.scheme.lower(), parsed.netloc.lower(), parsed.path, urllib.parse.urlencode(query), "")
+    )
+
+
+def _box_header(data: bytes, offset: int) -> Optional[Tuple[int, bytes, int]]:
+    """(box size, box type, header size) at `offset`, or None if the header is not in `data`."""
+    if offset + 8 > len(data):
+        return None
+    size, box_type = struct.unpack_from(">I4s", data, offset)
+    header = 8
+    if size == 1:
+        if offset + 16 > len(data):
+            return None
+        size = struct.unpack_from(">Q", data, offset + 8)[0]
+        header = 16
+    elif size == 0:
+        size = len(data) - offset  # runs to the end of the file
+    if size < header:
+        raise NotMP4(f"bad {box_type!r} box size {size}")
+    return size, box_type, header
+
+
+def _has_sound_track(box: bytes, box_type: bytes = b"moov") -> bool:
+    """Walk moov/trak/mdia and report whether any hdlr declares a sound track."""
+    child_type = CONTAINER_PATH[box_type]
+    offset = _box_header(box, 0)[2]
+    while True:
+        header = _box_header(box, offset)
+        if header is None:
+            return False
+        size, found, header_size = header
+        if found == child_type:
+            child = box[offset:offset + size]
+            if child_type == b"hdlr":
+                # version/flags (4), pre_defined (4), then the handler type
+                if child[header_size + 8:header_size + 12] == b"soun":
+                    return True
+            elif _has_sound_track(child, child_type):
+                return True
+        offset += size
+
+
+class MediaProbe:
+    """
+    Answers "does this video have an audio track?" for snap media.
+
+    MP4 files are read in-process: the box index is walked with HTTP Range
+    requests until `moov` is found, and its track handlers say whether a
+    sound track exists. Anything else falls back to ffprobe. Results are
+    cached per canonical URL, identical concurrent probes share one run,
+    and at most `concurrency` probes touch the network at once.
+    """
+
+    def __init__(self, concurrency: int):
+        self._slots = asyncio.Semaphore(max(concurrency, 1))
+        self._cache = TTLCache(PROBE_CACHE_SIZE)
+        self._inflight = SingleFlight(cancel_orphans=True)
+        self.mp4_probes = 0
+        self.ffprobe_probes = 0
+        self.failures = 0
+
+    async def has_audio(self, url: str) -> bool:
+        key = ("probe", canonical_media_url(url))
+        cached = self._cache.get(key)
+        if cached is not TTLCache.MISSING:
+            return cached
+        return await self._inflight.do(key, lambda: self._probe(key, url))
+
+    async def _probe(self, key: Tuple[str, str], url: str) -> bool:
+        async with self._slots:
+            result = None
+            try:
+                result = await self._probe_mp4(url)
+                self.mp4_probes += 1
+            except (NotMP4, httpx.HTTPError, struct.error) as e:
+                logger.debug(f"MP4 probe of {url} fell back to ffprobe: {e}")
+
+            if result is None:
+                result = await self._ffprobe(url)
+                self.ffprobe_probes += 1
+
+        if result is None:
+            # Unknown, so nothing is cached; send it as a video, which keeps any sound it has.
+            self.failures += 1
+            return True
+        self._cache.set(key, result, PROBE_CACHE_TTL)
+        return result
+
+    @staticmethod
+    async def _read_range(client: httpx.AsyncClient, url: str, start: int, length: int) -> bytes:
+        headers = {**PROBE_HEADERS, "Range": f"bytes={start}-{start + length - 1}"}
+        async with client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 200 and start > 0:
+                raise NotMP4("server ignores Range requests")
+            if response.status_code not in (200, 206):
+                raise NotMP4(f"HTTP {response.status_code}")
+
+            chunks, received = [], 0
+            async for chunk in response.aiter_bytes():
+                chunks.append(chunk)
+                received += len(chunk)
+                if received >= length:
+                    break  # a 200 response would otherwise stream the whole file
+        return b"".join(chunks)[:length]
+
+    async def _probe_mp4(self, url: str) -> bool:
+        client = await HttpClient.get_client("probe")
+        data = await self._read_range(client, url, 0, HEAD_BYTES)
+        if data[4:8] != b"ftyp":
+            raise NotMP4("no ftyp box")
+
+        # `base` is the file offset of data[0]; top-level boxes are walked until moov.
+        base, offset, fetches = 0, 0, 1
+        while True:
+            header = _box_header(data, offset - base)
+            if header is None or (header[1] == b"moov" and offset - base + header[0] > len(data)):
+                if fetches >= MAX_RANGE_FETCHES:
+                    raise NotMP4("moov not found within the fetch budget")
+                length = header[0] if header is not None else 16
+                if length > MAX_MOOV_BYTES:
+                    raise NotMP4(f"moov of {length} bytes")
+                data, base = await self._read_range(client, url, offset, length), offset
+                fetches += 1
+                if len(data) < 8:
+                    raise NotMP4("file ended before moov")
+                continue
+
+            size, box_type, _ = header
+            if box_type == b"moov":
+                return _has_sound_track(data[offset - base:offset - base + size])
+            offset += size
+
+    @staticmethod
+    async def _ffprobe(url: str) -> Optional[bool]:
+        cmd = [
+            'ffprobe',
+            '-v', 'error',
+            '-select_streams', 'a',
+            '-show_entries', 'stream=index',
+            '-of', 'csv=p=0',
+            '-user_agent', PROBE_HEADERS["User-Agent"],
+            url
+        ]
+
+        process = None
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=FFPROBE_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Error checking audio stream of {url}: {e}")
+            return None
+        finally:
+            if process is not None and process.returncode is None:
+                process.kill()
+
+        if stdout.strip():
+            return True
+        # Empty output only means "no audio" when ffprobe read the file cleanly;
+        # an expired link or a timeout must not be cached as a silent video.
+        if process.returncode != 0 or stderr.strip():
+            logger.warning(f"ffprobe could not read {url}: {stderr.decode(errors='replace').strip()[:200]}")
+            return None
+        return False
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            **self._cache.stats(),
+            "mp4_probes": self.mp4_probes,
+            "ffprobe_probes": self.ffprobe_probes,
+            "failures": self.failures,
+            **self._inflight.stats(),
+        }
+
+
+media_probe = MediaProbe(config.PROBE_CONCURRENCY)
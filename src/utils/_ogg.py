@@ -0,0 +1,297 @@
+import base64
+import hashlib
+import struct
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import BinaryIO, Iterator, List, Optional, Sequence, Tuple
+
+# Spotify ships the first page with its own header; these offsets turn it
+# back into a plain Vorbis identification page.
+SPOTIFY_HEADER_PATCHES = {
+    0: b'OggS',
+    6: b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00',
+    26: b'\x01\x1E\x01vorbis',
+    39: b'\x02',
+    40: b'\x44\xAC\x00\x00',
+    48: b'\x00\xE2\x04\x00',
+    56: b'\xB8\x01',
+    58: b'OggS',
+    62: b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00',
+}
+PATCHED_HEADER_SIZE = 72
+
+PAGE_HEADER = struct.Struct("<4sBBqIIIB")
+FLAG_CONTINUED = 0x01
+FLAG_BOS = 0x02
+FLAG_EOS = 0x04
+NO_GRANULE = -1
+MAX_SEGMENTS = 255
+DEFAULT_VENDOR = "SpTubeBot"
+
+PICTURE_TYPE_FRONT_COVER = 3
+PICTURE_DESCRIPTION = "Cover Artwork"
+MAX_CACHED_PICTURES = 64
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_STANDALONE_MARKERS = {0x01, *range(0xD0, 0xDA)}
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+_picture_cache: "OrderedDict[str, str]" = OrderedDict()
+_picture_lock = Lock()  # blocks are built on executor threads
+
+_BIT_REVERSE = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+
+Page = Tuple[int, int, bytes, bytes]  # header flags, granule, lacing, body
+
+
+class OggError(Exception):
+    pass
+
+
+def ogg_crc(data: bytes) -> int:
+    """Ogg page checksum (CRC-32, poly 0x04C11DB7, unreflected, no xor).
+
+    zlib only ships the reflected variant, so the input bytes and the
+    result are bit-reversed around it instead of looping in Python.
+    """
+    raw = zlib.crc32(data.translate(_BIT_REVERSE), 0xFFFFFFFF) ^ 0xFFFFFFFF
+    return int(f"{raw:032b}"[::-1], 2)
+
+
+class _PrefixedReader:
+    """Serves already-read (and patched) bytes before falling through to the file."""
+
+    def __init__(self, prefix: bytes, f: BinaryIO):
+        self._prefix = prefix
+        self._f = f
+
+    def read(self, size: int) -> bytes:
+        if not self._prefix:
+            return self._f.read(size)
+        data, self._prefix = self._prefix[:size], self._prefix[size:]
+        if len(data) < size:
+            data += self._f.read(size - len(data))
+        return data
+
+
+def _read_pages(reader) -> Iterator[Tuple[int, int, int, bytes, bytes]]:
+    while True:
+        header = reader.read(PAGE_HEADER.size)
+        if not header:
+            return
+        if len(header) < PAGE_HEADER.size:
+            raise OggError("Truncated page header")
+
+        capture, _, flags, granule, serial, _, _, segments = PAGE_HEADER.unpack(header)
+        if capture != b'OggS':
+            raise OggError("Lost page sync")
+
+        lacing = reader.read(segments)
+        body = reader.read(sum(lacing))
+        if len(lacing) != segments or len(body) != sum(lacing):
+            raise OggError("Truncated page body")
+        yield flags, granule, serial, lacing, body
+
+
+def _lacing_for(length: int) -> bytes:
+    return b'\xff' * (length // 255) + bytes([length % 255])
+
+
+def _paginate(packets: Sequence[bytes]) -> List[Page]:
+    """Lay header packets out over as few pages as possible."""
+    segments: List[Tuple[int, bool]] = []  # (lacing value, ends a packet)
+    for packet in packets:
+        lacing = _lacing_for(len(packet))
+        segments.extend((value, i == len(lacing) - 1) for i, value in enumerate(lacing))
+    payload = b''.join(packets)
+
+    pages: List[Page] = []
+    offset = 0
+    continued = False
+    for start in range(0, len(segments), MAX_SEGMENTS):
+        chunk = segments[start:start + MAX_SEGMENTS]
+        size = sum(value for value, _ in chunk)
+        ends_packet = any(end for _, end in chunk)
+        pages.append((
+            FLAG_CONTINUED if continued else 0,
+            0 if ends_packet else NO_GRANULE,
+            bytes(value for value, _ in chunk),
+            payload[offset:offset + size],
+        ))
+        offset += size
+        continued = not chunk[-1][1]
+    return pages
+
+
+def _parse_comments(packet: bytes) -> Tuple[str, List[str]]:
+    try:
+        if not packet.startswith(b'\x03vorbis'):
+            raise ValueError
+        pos = 7
+        (vendor_len,) = struct.unpack_from("<I", packet, pos)
+        pos += 4
+        vendor = packet[pos:pos + vendor_len].decode("utf-8")
+        pos += vendor_len
+        (count,) = struct.unpack_from("<I", packet, pos)
+        pos += 4
+        comments = []
+        for _ in range(count):
+            (length,) = struct.unpack_from("<I", packet, pos)
+            pos += 4
+            comments.append(packet[pos:pos + length].decode("utf-8"))
+            pos += length
+        return vendor, comments
+    except (ValueError, struct.error, UnicodeDecodeError):
+        return DEFAULT_VENDOR, []
+
+
+def build_comment_packet(vendor: str, comments: Sequence[str]) -> bytes:
+    parts = [b'\x03vorbis']
+    encoded_vendor = vendor.encode("utf-8")
+    parts.append(struct.pack("<I", len(encoded_vendor)) + encoded_vendor)
+    parts.append(struct.pack("<I", len(comments)))
+    for comment in comments:
+        encoded = comment.encode("utf-8")
+        parts.append(struct.pack("<I", len(encoded)) + encoded)
+    parts.append(b'\x01')
+    return b''.join(parts)
+
+
+def _merge_comments(existing: List[str], tags: Sequence[Tuple[str, str]]) -> List[str]:
+    replaced = {key.upper() for key, _ in tags}
+    kept = [c for c in existing if c.split("=", 1)[0].upper() not in replaced]
+    return kept + [f"{key.upper()}={value}" for key, value in tags]
+
+
+def _image_info(data: bytes) -> Tuple[str, int, int, int]:
+    """Return (mime, width, height, colour depth) from the image header, zeros if unknown."""
+    if data.startswith(PNG_SIGNATURE) and len(data) >= 26:
+        width, height, bit_depth, colour_type = struct.unpack_from(">IIBB", data, 16)
+        channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}.get(colour_type, 0)
+        return "image/png", width, height, bit_depth * channels
+
+    pos = 2 if data.startswith(b'\xff\xd8') else len(data)
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            break
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            pos += 2
+            continue
+        (length,) = struct.unpack_from(">H", data, pos + 2)
+        if marker in JPEG_SOF_MARKERS and pos + 10 <= len(data):
+            precision, height, width, components = struct.unpack_from(">BHHB", data, pos + 4)
+            return "image/jpeg", width, height, precision * components
+        pos += 2 + length
+    return "image/jpeg", 0, 0, 0
+
+
+def build_picture_block(data: bytes) -> str:
+    """
+    Base64 METADATA_BLOCK_PICTURE for a front cover.
+
+    Blocks are memoized by image hash, so every track of an album reuses the
+    same one.
+    """
+    digest = hashlib.sha1(data).hexdigest()
+    with _picture_lock:
+        cached = _picture_cache.get(digest)
+        if cached is not None:
+            _picture_cache.move_to_end(digest)
+            return cached
+
+    mime, width, height, depth = _image_info(data)
+    encoded_mime = mime.encode("ascii")
+    description = PICTURE_DESCRIPTION.encode("utf-8")
+    block = b''.join((
+        struct.pack(">II", PICTURE_TYPE_FRONT_COVER, len(encoded_mime)),
+        encoded_mime,
+        struct.pack(">I", len(description)),
+        description,
+        struct.pack(">IIIII", width, height, depth, 0, len(data)),
+        data,
+    ))
+    encoded = base64.b64encode(block).decode("ascii")
+
+    with _picture_lock:
+        _picture_cache[digest] = encoded
+        if len(_picture_cache) > MAX_CACHED_PICTURES:
+            _picture_cache.popitem(last=False)
+    return encoded
+
+
+def _write_page(out: BinaryIO, flags: int, granule: int, serial: int, seq: int, lacing: bytes, body: bytes) -> None:
+    header = PAGE_HEADER.pack(b'OggS', 0, flags, granule, serial, seq, 0, len(lacing))
+    page = header + lacing + body
+    crc = ogg_crc(page)
+    out.write(page[:22] + struct.pack("<I", crc) + page[26:])
+
+
+def write_tagged_ogg(src: Path, dst: Path, tags: Sequence[Tuple[str, str]], patch_spotify: bool = True) -> None:
+    """
+    Rewrite `src` into `dst` in a single pass with new Vorbis comments.
+
+    The Spotify header patch is applied in memory, the comment packet is
+    replaced (tags in `tags` override existing keys), and every page is
+    renumbered under one serial with a fresh CRC.
+    """
+    with src.open('rb') as f, dst.open('wb') as out:
+        head = bytearray(f.read(PATCHED_HEADER_SIZE))
+        if patch_spotify:
+            if len(head) < PATCHED_HEADER_SIZE:
+                raise OggError("File too short for an Ogg Vorbis stream")
+            for offset, data in SPOTIFY_HEADER_PATCHES.items():
+                head[offset:offset + len(data)] = data
+        pages = _read_pages(_PrefixedReader(bytes(head), f))
+
+        packets: List[bytes] = []
+        partial = b''
+        serial: Optional[int] = None
+        leftover: Optional[Tuple[int, bytes, bytes]] = None
+        for page_index, (_, granule, page_serial, lacing, body) in enumerate(pages):
+            if page_index == 1 or serial is None:
+                serial = page_serial
+            pos = 0
+            for i, value in enumerate(lacing):
+                partial += body[pos:pos + value]
+                pos += value
+                if value < 255:
+                    packets.append(partial)
+                    partial = b''
+                    if len(packets) == 3:
+                        if i + 1 < len(lacing):
+                            leftover = (granule, lacing[i + 1:], body[pos:])
+                        break
+            if len(packets) == 3:
+                break
+
+        if len(packets) < 3 or not packets[0].startswith(b'\x01vorbis'):
+            raise OggError("Missing Vorbis header packets")
+
+        vendor, existing = _parse_comments(packets[1])
+        comment_packet = build_comment_packet(vendor, _merge_comments(existing, tags))
+
+        out_pages: List[Page] = [(FLAG_BOS, 0, _lacing_for(len(packets[0])), packets[0])]
+        out_pages.extend(_paginate([comment_packet, packets[2]]))
+        if leftover:
+            granule, lacing, body = leftover
+            out_pages.append((0, granule, lacing, body))
+
+        seq = 0
+        for flags, granule, lacing, body in out_pages:
+            _write_page(out, flags, granule, serial, seq, lacing, body)
+            seq += 1
+
+        # Audio pages keep their layout and granules; only the page header changes.
+        previous = None
+        for flags, granule, _, lacing, body in pages:
+            if previous:
+                _write_page(out, previous[0] & FLAG_CONTINUED, previous[1], serial, seq, previous[2], previous[3])
+                seq += 1
+            previous = (flags, granule, lacing, body)
+        if previous:
+            _write_page(out, (previous[0] & FLAG_CONTINUED) | FLAG_EOS, previous[1], serial, seq, previous[2], previous[3])
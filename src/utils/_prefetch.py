@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from typing import Dict, Hashable, List
+
+from pytdbot import types
+
+from src import config
+
+from ._api import ApiData
+from ._cache import upload_cache
+from ._downloader import Download
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_CONCURRENCY = 4  # warm-ups never take more than this many API/cover requests at once
+
+
+class Prefetcher:
+    """
+    Warms the track metadata and cover for the top search results.
+
+    The `get_track` response lands in the ApiData cache and the cover in the
+    disk cache, so a tap on a warmed result starts straight at the CDN
+    download. A tap that joins a warm-up still in flight shares its request.
+    Warm-ups are best effort: they are dropped when the concurrency share is
+    used up, cancelled after `budget` seconds, and cancelled as soon as the
+    user picks a different result from the same message.
+    """
+
+    def __init__(self, results: int, budget: float):
+        self.results = results
+        self.budget = budget
+        self._slots = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+        self._pending: Dict[Hashable, Dict[str, asyncio.Task]] = {}
+        self.started = 0
+        self.skipped = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.timed_out = 0
+        self.used = 0
+
+    def warm(self, owner: Hashable, urls: List[str]) -> None:
+        """Start warm-ups for the first results shown in message `owner`."""
+        if self.results <= 0:
+            return
+
+        tasks = {}
+        for url in urls[:self.results]:
+            if upload_cache.contains(upload_cache.url_key(url)):
+                continue  # sent before; the tap will not touch the API at all
+            if self._slots.locked():
+                self.skipped += 1
+                continue
+            tasks[url] = asyncio.create_task(self._warm(url))
+            tasks[url].add_done_callback(lambda _, o=owner, u=url: self._forget(o, u))
+            self.started += 1
+        if tasks:
+            self._pending[owner] = tasks
+
+    def claim(self, owner: Hashable, url: str) -> None:
+        """The user tapped `url`: keep its warm-up, cancel the others from that message."""
+        tasks = self._pending.get(owner)
+        if not tasks:
+            return
+        for other_url, task in list(tasks.items()):
+            if other_url == url:
+                self.used += 1
+            elif not task.done():
+                task.cancel()
+
+    async def _warm(self, url: str) -> None:
+        try:
+            async with self._slots:
+                await asyncio.wait_for(self._fetch(url), timeout=self.budget)
+            self.completed += 1
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+        except asyncio.CancelledError:
+            self.cancelled += 1
+        except Exception as e:
+            logger.debug(f"Prefetch of {url} failed: {e}")
+
+    @staticmethod
+    async def _fetch(url: str) -> None:
+        track = await ApiData(url).get_track()
+        if isinstance(track, types.Error):
+            return
+        await Download(track).save_cover(track.cover)
+
+    def _forget(self, owner: Hashable, url: str) -> None:
+        tasks = self._pending.get(owner)
+        if tasks is None:
+            return
+        tasks.pop(url, None)
+        if not tasks:
+            del self._pending[owner]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "started": self.started,
+            "used": self.used,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "timed_out": self.timed_out,
+            "skipped": self.skipped,
+        }
+
+
+prefetcher = Prefetcher(config.PREFETCH_RESULTS, config.PREFETCH_BUDGET_SECONDS)
@@ -0,0 +1,125 @@
+import asyncio
+from pathlib import Path
+from typing import BinaryIO, Callable, List, Optional, Tuple
+
+import httpx
+
+from src import config
+
+from ._api import _executor
+
+CHUNK_SIZE = 1024 * 1024 * 2  # 2MB
+MIN_SEGMENTED_SIZE = 1024 * 1024 * 8  # below this one connection is fast enough
+SEGMENT_ALIGN = 16  # AES block size, so CTR segments start on a block boundary
+
+# Given a byte offset, returns a function applied to every chunk from that offset on.
+TransformFactory = Callable[[int], Callable[[bytes], bytes]]
+
+
+class DownloadStatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"Unexpected status code: {status_code}")
+        self.status_code = status_code
+
+
+def _segment_bounds(size: int, parts: int) -> List[Tuple[int, int]]:
+    """Split [0, size) into `parts` inclusive byte ranges aligned to SEGMENT_ALIGN."""
+    step = -(-size // parts)
+    step += -step % SEGMENT_ALIGN
+    return [(start, min(start + step, size) - 1) for start in range(0, size, step)]
+
+
+def _write_at(f: BinaryIO, transform: Optional[Callable[[bytes], bytes]], chunk: bytes) -> None:
+    f.write(transform(chunk) if transform else chunk)
+
+
+async def _copy_response(
+    response: httpx.Response,
+    path: Path,
+    offset: int,
+    length: Optional[int],
+    transform_factory: Optional[TransformFactory],
+) -> None:
+    """Write the body of `response` into `path` at `offset`, stopping after `length` bytes."""
+    loop = asyncio.get_running_loop()
+    transform = transform_factory(offset) if transform_factory else None
+    written = 0
+
+    with path.open('r+b' if length is not None else 'wb') as f:
+        f.seek(offset)
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            if length is not None and written + len(chunk) >= length:
+                chunk = chunk[:length - written]
+            await loop.run_in_executor(_executor, _write_at, f, transform, chunk)
+            written += len(chunk)
+            if length is not None and written >= length:
+                break
+
+    if length is not None and written != length:
+        raise httpx.ReadError(f"Range at {offset} ended after {written} of {length} bytes")
+
+
+async def _fetch_range(
+    client: httpx.AsyncClient,
+    url: str,
+    path: Path,
+    start: int,
+    end: int,
+    transform_factory: Optional[TransformFactory],
+) -> None:
+    async with client.stream('GET', url, headers={"Range": f"bytes={start}-{end}"}) as response:
+        if response.status_code != 206:
+            raise DownloadStatusError(response.status_code)
+        await _copy_response(response, path, start, end - start + 1, transform_factory)
+
+
+async def download_to_file(
+    client: httpx.AsyncClient,
+    url: str,
+    path: Path,
+    transform_factory: Optional[TransformFactory] = None,
+    parts: Optional[int] = None,
+) -> httpx.Headers:
+    """
+    Download `url` into `path`, optionally transforming the bytes on the way,
+    and return the headers of the response.
+
+    If the server advertises `Accept-Ranges: bytes` and the file is large
+    enough, the first response is kept for the first segment and the rest
+    are fetched as concurrent Range requests into the preallocated file.
+    Otherwise it is a plain single stream.
+    """
+    parts = config.SEGMENTED_DOWNLOADS if parts is None else parts
+
+    async with client.stream('GET', url) as response:
+        if response.status_code != 200:
+            raise DownloadStatusError(response.status_code)
+
+        size = int(response.headers.get("Content-Length") or 0)
+        ranged = (
+            parts > 1
+            and size >= MIN_SEGMENTED_SIZE
+            and response.headers.get("Accept-Ranges", "").lower() == "bytes"
+            and not response.headers.get("Content-Encoding")
+        )
+        if not ranged:
+            await _copy_response(response, path, 0, None, transform_factory)
+            return response.headers
+
+        bounds = _segment_bounds(size, parts)
+        with path.open('wb') as f:
+            f.truncate(size)
+
+        target = str(response.url)
+        tasks = [
+            asyncio.create_task(_fetch_range(client, target, path, start, end, transform_factory))
+            for start, end in bounds[1:]
+        ]
+        try:
+            await _copy_response(response, path, 0, bounds[0][1] + 1, transform_factory)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return response.headers
@@ -0,0 +1,102 @@
+import random
+import time
+import urllib.parse
+from typing import Dict, Optional
+
+HALF_LIFE = 1800  # seconds; an outcome counts half as much after this long
+MIN_WEIGHT = 4.0  # decayed outcomes needed before a host is judged
+MIN_SUCCESS_RATE = 0.3  # below this, upload from a local download straight away
+EXPLORE_RATE = 0.1  # share of requests to a skipped host that still try the URL
+MAX_HOSTS = 500
+STATS_HOSTS = 10
+
+
+class _HostScore:
+    __slots__ = ("successes", "weight", "updated")
+
+    def __init__(self):
+        self.successes = 0.0
+        self.weight = 0.0
+        self.updated = time.monotonic()
+
+    def decay(self, now: float) -> None:
+        factor = 0.5 ** ((now - self.updated) / HALF_LIFE)
+        self.successes *= factor
+        self.weight *= factor
+        self.updated = now
+
+    @property
+    def rate(self) -> float:
+        return self.successes / self.weight if self.weight else 1.0
+
+
+class RemoteURLTracker:
+    """
+    Tracks how often Telegram manages to fetch media URLs itself, per host.
+
+    Sending `InputFileRemote(url)` costs a full Telegram round-trip when
+    Telegram cannot fetch the URL (WEBPAGE_CURL_FAILED). Hosts whose
+    recent success rate is low are sent from a local download instead.
+    Outcomes decay with a half-life, and a few requests to a skipped host
+    still try the URL, so a host that recovers is noticed again.
+    """
+
+    def __init__(self):
+        self._hosts: Dict[str, _HostScore] = {}
+        self.skipped = 0
+        self.explored = 0
+
+    @staticmethod
+    def host_of(url: str) -> Optional[str]:
+        """Full hostname of the URL, so unrelated hosts never share a score; None for file_ids."""
+        if not url.startswith(("http://", "https://")):
+            return None
+        try:
+            return urllib.parse.urlsplit(url).hostname or None
+        except ValueError:
+            return None
+
+    def should_try_remote(self, url: str) -> bool:
+        host = self.host_of(url)
+        score = self._hosts.get(host) if host else None
+        if score is None:
+            return True
+
+        score.decay(time.monotonic())
+        if score.weight < MIN_WEIGHT or score.rate >= MIN_SUCCESS_RATE:
+            return True
+        if random.random() < EXPLORE_RATE:
+            self.explored += 1
+            return True
+        self.skipped += 1
+        return False
+
+    def record(self, url: str, success: bool) -> None:
+        host = self.host_of(url)
+        if host is None:
+            return
+
+        score = self._hosts.get(host)
+        if score is None:
+            if len(self._hosts) >= MAX_HOSTS:
+                del self._hosts[min(self._hosts, key=lambda h: self._hosts[h].updated)]
+            score = self._hosts[host] = _HostScore()
+
+        score.decay(time.monotonic())
+        score.weight += 1
+        score.successes += 1 if success else 0
+
+    def stats(self) -> Dict[str, object]:
+        now = time.monotonic()
+        for score in self._hosts.values():
+            score.decay(now)
+
+        stats: Dict[str, object] = {"skipped": self.skipped, "explored": self.explored}
+        busiest = sorted(self._hosts.items(), key=lambda item: item[1].weight, reverse=True)[:STATS_HOSTS]
+        for host, score in busiest:
+            local = score.weight >= MIN_WEIGHT and score.rate < MIN_SUCCESS_RATE
+            stats[host] = f"{score.rate:.0%} of {score.weight:.1f}" + (", local first" if local else "")
+        return stats
+
+
+remote_urls = RemoteURLTracker()
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, TypeVar
+from urllib.parse import urlparse
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.25  # seconds, doubled on each attempt
+RETRY_MAX_DELAY = 4.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BREAKER_THRESHOLD = 5  # consecutive transient failures before the breaker opens
+BREAKER_RESET = 30.0  # seconds open before a single probe request is let through
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(httpx.RequestError):
+    """Raised instead of sending a request to a host that is known to be down."""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"{host} is unavailable, retrying in {retry_in:.0f}s")
+        self.host = host
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Whether a failure is worth retrying and counts against the host."""
+    if isinstance(exc, (CircuitOpenError, httpx.PoolTimeout)):
+        return False  # not the upstream's fault
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRY_STATUSES
+    return getattr(exc, "status_code", None) in RETRY_STATUSES
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open probe -> closed again."""
+
+    def __init__(self, host: str, threshold: int = BREAKER_THRESHOLD, reset_after: float = BREAKER_RESET):
+        self.host = host
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self.retries = 0
+        self._probing = False
+
+    def before_request(self) -> None:
+        if self.state == STATE_CLOSED:
+            return
+
+        remaining = self.opened_at + self.reset_after - time.monotonic()
+        if self.state == STATE_OPEN and remaining <= 0:
+            self.state = STATE_HALF_OPEN
+        if self.state == STATE_HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+
+        self.rejected += 1
+        raise CircuitOpenError(self.host, max(remaining, 0))
+
+    def record_success(self) -> None:
+        self._probing = False
+        self.failures = 0
+        if self.state != STATE_CLOSED:
+            logger.info(f"Circuit for {self.host} closed")
+        self.state = STATE_CLOSED
+
+    def record_failure(self) -> None:
+        self._probing = False
+        self.failures += 1
+        if self.state == STATE_HALF_OPEN or self.failures >= self.threshold:
+            if self.state != STATE_OPEN:
+                self.times_opened += 1
+                logger.warning(f"Circuit for {self.host} opened after {self.failures} failures")
+            self.state = STATE_OPEN
+            self.opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """A probe that ended without an answer (e.g. cancelled) lets the next caller try."""
+        self._probing = False
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opened": self.times_opened,
+            "retries": self.retries,
+            "rejected": self.rejected,
+        }
+
+
+class Resilience:
+    """
+    Retries with jittered exponential backoff plus a circuit breaker per host.
+
+    Only use it for idempotent requests (GETs): a retried call runs again from
+    the start.
+    """
+
+    def __init__(self, attempts: int = RETRY_ATTEMPTS):
+        self.attempts = attempts
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def breaker(self, url: str) -> CircuitBreaker:
+        host = urlparse(url).netloc or url
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker(host)
+        return breaker
+
+    @staticmethod
+    def backoff(attempt: int) -> float:
+        """Full jitter, so clients that failed together do not retry together."""
+        return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+    async def call(
+        self,
+        url: str,
+        func: Callable[[], Awaitable[T]],
+        retryable: Callable[[BaseException], bool] = is_transient,
+    ) -> T:
+        breaker = self.breaker(url)
+        attempt = 0
+        while True:
+            breaker.before_request()
+            try:
+                result = await func()
+            except asyncio.CancelledError:
+                breaker.release_probe()
+                raise
+            except Exception as e:
+                if not retryable(e):
+                    breaker.record_success()  # the host answered, the request was just bad
+                    raise
+                breaker.record_failure()
+                attempt += 1
+                if attempt >= self.attempts:
+                    raise
+                breaker.retries += 1
+                delay = self.backoff(attempt - 1)
+                logger.info(f"Retrying {breaker.host} in {delay:.2f}s after: {e!r}")
+                await asyncio.sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+
+    async def get(self, client: httpx.AsyncClient, url: str, **kwargs) -> httpx.Response:
+        """`client.get` that raises `httpx.HTTPStatusError` for retryable statuses once attempts run out."""
+
+        async def attempt() -> httpx.Response:
+            response = await client.get(url, **kwargs)
+            if response.status_code in RETRY_STATUSES:
+                response.raise_for_status()
+            return response
+
+        return await self.call(url, attempt)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {host: breaker.stats() for host, breaker in self._breakers.items()}
+
+
+resilience = Resilience()
@@ -0,0 +1,168 @@
+import re
+import urllib.parse
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Tuple
+
+KIND_TRACK = "track"
+KIND_SNAP = "snap"
+
+MAX_QUERY_LENGTH = 500  # the bound ApiData applies to queries
+ROUTE_CACHE_SIZE = 4096
+ROUTE_ATTR = "_sptube_route"  # set on updates once classified
+
+URL_HOST = re.compile(r"https?://([^/\s?#]+)", re.IGNORECASE)
+
+URL_PATTERNS = {
+    "spotify": re.compile(
+        r'^(https?://)?([a-z0-9-]+\.)*spotify\.com/(track|playlist|album|artist)/[a-zA-Z0-9]+(\?.*)?$'),
+    "youtube": re.compile(r'^(https?://)?([a-z0-9-]+\.)*(youtube\.com/watch\?v=|youtu\.be/)[\w-]+(\?.*)?$'),
+    "youtube_music": re.compile(r'^(https?://)?([a-z0-9-]+\.)*youtube\.com/(watch\?v=|playlist\?list=)[\w-]+(\?.*)?$'),
+    "soundcloud": re.compile(r'^(https?://)?([a-z0-9-]+\.)*soundcloud\.com/[\w-]+(/[\w-]+)?(/sets/[\w-]+)?(\?.*)?$'),
+    "apple_music": re.compile(
+        r'^(https?://)?([a-z0-9-]+\.)?apple\.com/[a-z]{2}/(album|playlist|song)/[^/]+/(pl\.[a-zA-Z0-9]+|\d+)(\?i=\d+)?(\?.*)?$')
+}
+
+SNAP_PATTERNS = {
+    "instagram": re.compile(r"(?i)https?://(?:www\.)?(instagram\.com|instagr\.am)/(reel|stories|p|tv)/[^\s/?]+"),
+    "pinterest": re.compile(r"(?i)https?://(?:[a-z]+\.)?(pinterest\.com|pin\.it)/[^\s]+"),
+    "facebook_watch": re.compile(r"(?i)https?://(?:www\.)?fb\.watch/[^\s/?]+"),
+    "facebook": re.compile(r"(?i)https?://(?:www\.)?facebook\.com/.+/videos/\d+"),
+    "tiktok": re.compile(
+        r"https?://(?:www\.|m\.)?(?:vt\.)?tiktok\.com/(?:@[\w.-]+/video/\d+|v/\d+\.html|t/[\w]+|[\w]+)",
+        re.IGNORECASE
+    ),
+    "twitter": re.compile(r"(https?://(?:www\.)?(?:x|twitter)\.com/[^\s]+)", re.IGNORECASE),
+    "threads": re.compile(
+        r'^https?://(?:www\.)?threads\.(?:com|net)/@[\w.-]+/post/[\w-]+(?:\?[\w=&%-]+)?$',
+        re.IGNORECASE
+    ),
+    "reddit": re.compile(
+        r"https?://(?:www\.|old\.)?reddit\.com/r/[\w]+/comments/[\w]+(?:/[^\s]*)?|https?://redd\.it/[\w]+",
+        re.IGNORECASE
+    ),
+    "twitch": re.compile(
+        r"https?://(?:clips\.twitch\.tv/|(?:www\.)?twitch\.tv/[^/]+/clip/)([\w-]+(?:-\w+)*)",
+        re.IGNORECASE
+    ),
+}
+
+# What identifies a post on each snap platform. Short links keep their short
+# code, which always resolves to the same post.
+SNAP_POST_IDS = {
+    "instagram": re.compile(r"/(?:reel|p|tv)/([\w-]+)|/stories/[\w.]+/(\d+)"),
+    "pinterest": re.compile(r"/pin/(?:[\w-]*--)?(\d+)|pin\.it/([\w-]+)", re.IGNORECASE),
+    "facebook_watch": re.compile(r"fb\.watch/([\w-]+)", re.IGNORECASE),
+    "facebook": re.compile(r"/videos/(\d+)"),
+    "tiktok": re.compile(r"/video/(\d+)|/v/(\d+)\.html|tiktok\.com/(?:t/)?(\w+)/?(?:[?#]|$)", re.IGNORECASE),
+    "twitter": re.compile(r"/status(?:es)?/(\d+)"),
+    "threads": re.compile(r"/post/([\w-]+)"),
+    "reddit": re.compile(r"/comments/(\w+)|redd\.it/(\w+)", re.IGNORECASE),
+    "twitch": re.compile(r"(?:clips\.twitch\.tv/|/clip/)([\w-]+)", re.IGNORECASE),
+}
+
+# Registrable domain -> platforms whose patterns can match a URL on it.
+HOST_TABLE: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    "spotify.com": ((KIND_TRACK, "spotify"),),
+    "youtube.com": ((KIND_TRACK, "youtube"), (KIND_TRACK, "youtube_music")),
+    "youtu.be": ((KIND_TRACK, "youtube"),),
+    "soundcloud.com": ((KIND_TRACK, "soundcloud"),),
+    "apple.com": ((KIND_TRACK, "apple_music"),),
+    "instagram.com": ((KIND_SNAP, "instagram"),),
+    "instagr.am": ((KIND_SNAP, "instagram"),),
+    "pinterest.com": ((KIND_SNAP, "pinterest"),),
+    "pin.it": ((KIND_SNAP, "pinterest"),),
+    "fb.watch": ((KIND_SNAP, "facebook_watch"),),
+    "facebook.com": ((KIND_SNAP, "facebook"),),
+    "tiktok.com": ((KIND_SNAP, "tiktok"),),
+    "x.com": ((KIND_SNAP, "twitter"),),
+    "twitter.com": ((KIND_SNAP, "twitter"),),
+    "threads.com": ((KIND_SNAP, "threads"),),
+    "threads.net": ((KIND_SNAP, "threads"),),
+    "reddit.com": ((KIND_SNAP, "reddit"),),
+    "redd.it": ((KIND_SNAP, "reddit"),),
+    "twitch.tv": ((KIND_SNAP, "twitch"),),
+}
+
+
+class Route(NamedTuple):
+    platform: str
+    kind: str
+
+
+class URLRouter:
+    """
+    Classifies message text as a music link, a snap (social media) link or neither.
+
+    Hosts are looked up in a dispatch table first, so only the one or two
+    patterns that can possibly match are run. Results are memoized by text
+    and can be pinned to an update object, so every filter and handler that
+    looks at the same message shares one classification.
+    """
+
+    def __init__(self):
+        self.classify = lru_cache(maxsize=ROUTE_CACHE_SIZE)(self._classify)
+
+    @staticmethod
+    def _candidates(host: str) -> Tuple[Tuple[str, str], ...]:
+        host = host.rpartition("@")[2].partition(":")[0].lower()
+        labels = host.split(".")
+        for i in range(len(labels) - 1):
+            candidates = HOST_TABLE.get(".".join(labels[i:]))
+            if candidates:
+                return candidates
+        return ()
+
+    @staticmethod
+    def _is_track_url(text: str, platform: str) -> bool:
+        """Music links must be the whole message."""
+        try:
+            parsed = urllib.parse.urlparse(text)
+        except ValueError:
+            return False
+        return bool(parsed.scheme and parsed.netloc) and bool(URL_PATTERNS[platform].search(text))
+
+    def _classify(self, text: str) -> Optional[Route]:
+        text = text[:MAX_QUERY_LENGTH]
+        for match in URL_HOST.finditer(text):
+            for kind, platform in self._candidates(match.group(1)):
+                if kind == KIND_TRACK:
+                    if match.start() == 0 and self._is_track_url(text, platform):
+                        return Route(platform, kind)
+                elif SNAP_PATTERNS[platform].search(text):
+                    return Route(platform, kind)
+        return None
+
+    def classify_event(self, event, text: str) -> Optional[Route]:
+        """Classify `text` from `event`, reusing the result cached on the event."""
+        cached = getattr(event, ROUTE_ATTR, self)
+        if cached is not self:
+            return cached
+
+        route = self.classify(text)
+        try:
+            setattr(event, ROUTE_ATTR, route)
+        except AttributeError:
+            pass
+        return route
+
+    def snap_post_id(self, text: str) -> Optional[str]:
+        """`platform:id` of the post a snap link points at, the same for every URL form of it."""
+        route = self.classify(text)
+        if route is None or route.kind != KIND_SNAP:
+            return None
+        match = SNAP_POST_IDS[route.platform].search(text)
+        if match is None:
+            return None
+        post_id = next(group for group in match.groups() if group)
+        return f"{route.platform}:{post_id}"
+
+    def is_track(self, text: str) -> bool:
+        route = self.classify(text)
+        return route is not None and route.kind == KIND_TRACK
+
+    def is_snap(self, text: str) -> bool:
+        route = self.classify(text)
+        return route is not None and route.kind == KIND_SNAP
+
+
+url_router = URLRouter()
@@ -0,0 +1,108 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Tuple
+
+from src import config
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BULK: "bulk"}
+
+
+class PrioritySlots:
+    """
+    A semaphore that hands freed slots to the highest-priority waiter first.
+
+    Waiters of equal priority are served in arrival order.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self.queued: Dict[int, int] = {priority: 0 for priority in PRIORITY_NAMES}
+
+    async def acquire(self, priority: int) -> None:
+        if self.active < self.limit and not self.queued_total():
+            self.active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        self.queued[priority] = self.queued.get(priority, 0) + 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                self.queued[priority] -= 1
+            else:
+                # The slot was handed over just as we were cancelled; pass it on.
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            priority, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self.queued[priority] -= 1
+            future.set_result(None)  # the slot moves to the waiter, `active` is unchanged
+            return
+        self.active -= 1
+
+    def queued_total(self) -> int:
+        return sum(self.queued.values())
+
+
+class DownloadScheduler:
+    """
+    Bounds concurrent download jobs per platform.
+
+    Interactive single-track requests always go ahead of queued playlist
+    work, so one large playlist cannot starve everyone else.
+    """
+
+    def __init__(self, slots_per_platform: int):
+        self.slots_per_platform = slots_per_platform
+        self._platforms: Dict[str, PrioritySlots] = {}
+        self._acquired: Dict[str, int] = {}
+        self._completed: Dict[str, int] = {}
+        self._wait_total: Dict[str, float] = {}
+
+    def _slots(self, platform: str) -> PrioritySlots:
+        slots = self._platforms.get(platform)
+        if slots is None:
+            slots = self._platforms[platform] = PrioritySlots(self.slots_per_platform)
+        return slots
+
+    @asynccontextmanager
+    async def slot(self, platform: str, priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[None]:
+        slots = self._slots(platform)
+        started = time.monotonic()
+        await slots.acquire(priority)
+        self._acquired[platform] = self._acquired.get(platform, 0) + 1
+        self._wait_total[platform] = self._wait_total.get(platform, 0.0) + time.monotonic() - started
+        try:
+            yield
+        finally:
+            slots.release()
+            self._completed[platform] = self._completed.get(platform, 0) + 1
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        stats = {}
+        for platform, slots in self._platforms.items():
+            acquired = self._acquired.get(platform, 0)
+            stats[platform] = {
+                "active": f"{slots.active}/{slots.limit}",
+                **{f"queued_{name}": slots.queued.get(priority, 0) for priority, name in PRIORITY_NAMES.items()},
+                "completed": self._completed.get(platform, 0),
+                "avg_wait_ms": round(self._wait_total.get(platform, 0.0) / acquired * 1000, 1) if acquired else 0,
+            }
+        return stats
+
+
+download_scheduler = DownloadScheduler(config.DOWNLOAD_SLOTS)
@@ -0,0 +1,83 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Set, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one running task.
+
+    The first caller starts the work; everyone arriving while it is still
+    running awaits the same task. Each caller waits through `asyncio.shield`,
+    so cancelling one of them never cancels the shared work for the rest.
+
+    With `cancel_orphans`, the work is cancelled once every caller that was
+    waiting on it has been cancelled, unless it was started with `start`.
+    """
+
+    def __init__(self, cancel_orphans: bool = False):
+        self.cancel_orphans = cancel_orphans
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._pinned: Set[asyncio.Task] = set()
+        self.started = 0
+        self.shared = 0
+        self.abandoned = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._start(key, func)
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        cancelled = False
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            orphaned = self._release(task) == 0
+            if cancelled and orphaned and self.cancel_orphans and task not in self._pinned and not task.done():
+                task.cancel()
+                self.abandoned += 1
+
+    def start(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> "asyncio.Task[T]":
+        """Start (or join) the work for `key` without waiting for it; it always runs to completion."""
+        task = self._start(key, func)
+        self._pinned.add(task)
+        return task
+
+    def running(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def _start(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> "asyncio.Task[T]":
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.started += 1
+        else:
+            self.shared += 1
+        return task
+
+    def _release(self, task: asyncio.Task) -> int:
+        remaining = self._waiters.get(task, 0) - 1
+        if remaining > 0:
+            self._waiters[task] = remaining
+        else:
+            self._waiters.pop(task, None)
+        return remaining
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        self._pinned.discard(task)
+        # Mark the result as seen even if every waiter was cancelled.
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        stats = {"inflight": len(self._inflight), "started": self.started, "shared": self.shared}
+        if self.cancel_orphans:
+            stats["abandoned"] = self.abandoned
+        return stats
@@ -0,0 +1,7 @@
+import os
+
+# `src` builds the bot client on import; give it placeholder credentials.
+os.environ.setdefault("API_ID", "1")
+os.environ.setdefault("API_HASH", "test")
+os.environ.setdefault("TOKEN", "1:test")
+os.environ.setdefault("UPLOAD_CACHE_PATH", "")
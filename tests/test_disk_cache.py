@@ -0,0 +1,89 @@
+import pytest
+
+from src.utils import _disk_cache
+from src.utils._disk_cache import EVICT_GRACE, DiskCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(_disk_cache.time, "time", lambda: now[0])
+    return now
+
+
+def _publish(cache: DiskCache, key: str, name: str, size: int):
+    tmp = cache.temp_path()
+    tmp.write_bytes(b"x" * size)
+    return cache.publish(key, tmp, name)
+
+
+def test_files_are_published_under_a_readable_name(tmp_path, clock):
+    cache = DiskCache(tmp_path, max_bytes=1000, max_age=3600)
+    key = cache.make_key("spotify", "123")
+
+    path = _publish(cache, key, "Song: Title.ogg", 10)
+
+    assert path == tmp_path / key / "Song: Title.ogg"
+    assert cache.get(key) == path
+    assert not list(tmp_path.glob(".sptube-*.part"))
+
+
+def test_names_cannot_leave_the_key_directory(tmp_path, clock):
+    cache = DiskCache(tmp_path, max_bytes=1000, max_age=3600)
+
+    assert _publish(cache, "a", "../../escape.ogg", 1) == tmp_path / "a" / "escape.ogg"
+    assert _publish(cache, "b", ".ogg", 1) == tmp_path / "b" / "b.ogg"
+    long_name = _publish(cache, "c", "x" * 300 + ".flac", 1).name
+    assert long_name.endswith(".flac") and len(long_name.encode()) <= _disk_cache.MAX_NAME_LENGTH
+
+
+def test_republishing_a_key_replaces_the_old_file(tmp_path, clock):
+    cache = DiskCache(tmp_path, max_bytes=1000, max_age=3600)
+    old = _publish(cache, "key", "old.mp3", 10)
+    new = _publish(cache, "key", "new.mp3", 20)
+
+    assert not old.exists()
+    assert new.exists()
+    assert cache.stats()["bytes"] == 20
+
+
+def test_evict_drops_least_recently_used_until_under_budget(tmp_path, clock):
+    cache = DiskCache(tmp_path, max_bytes=25, max_age=10 * EVICT_GRACE)
+    paths = {}
+    for key in ("first", "second", "third"):
+        paths[key] = _publish(cache, key, f"{key}.ogg", 10)
+        clock[0] += 1
+    clock[0] += EVICT_GRACE
+    cache.get("first")  # now the most recently used
+
+    assert cache.evict() == 1
+    assert not paths["second"].exists() and not (tmp_path / "second").exists()
+    assert paths["first"].exists() and paths["third"].exists()
+    assert cache.stats()["bytes"] == 20
+
+
+def test_evict_spares_recent_files_and_drops_expired_ones(tmp_path, clock):
+    cache = DiskCache(tmp_path, max_bytes=1, max_age=2 * EVICT_GRACE)
+    old = _publish(cache, "old", "old.ogg", 10)
+    clock[0] += 3 * EVICT_GRACE
+    recent = _publish(cache, "recent", "recent.ogg", 10)
+
+    # Over budget, but the recent file may still be uploading.
+    assert cache.evict() == 1
+    assert not old.exists()
+    assert recent.exists()
+
+
+def test_load_keeps_indexed_files_that_still_exist(tmp_path, clock):
+    cache = DiskCache(tmp_path, max_bytes=1000, max_age=3600)
+    kept = _publish(cache, "kept", "kept.ogg", 10)
+    gone = _publish(cache, "gone", "gone.ogg", 10)
+    gone.unlink()
+    (tmp_path / ".sptube-stale.part").write_bytes(b"partial")
+
+    reloaded = DiskCache(tmp_path, max_bytes=1000, max_age=3600)
+    reloaded.load()
+
+    assert reloaded.get("kept") == kept
+    assert reloaded.get("gone") is None
+    assert not (tmp_path / ".sptube-stale.part").exists()
@@ -0,0 +1,83 @@
+import html
+
+import pytest
+
+from src.utils._formatting import format_html
+
+# Input -> (text, entities) as TDLib's parseTextEntities (textParseModeHTML)
+# returns it. Entities are (offset, length, type, url) in UTF-16 code units,
+# sorted by offset, longer first.
+TDLIB_PARITY = [
+    (
+        "<b>🎧 Track:</b> <b>Tom &amp; Jerry</b>",
+        "🎧 Track: Tom & Jerry",
+        [(0, 9, "textEntityTypeBold", None), (10, 11, "textEntityTypeBold", None)],
+    ),
+    (
+        "<b>bold <i>both</i></b> <i>it</i>",
+        "bold both it",
+        [
+            (0, 9, "textEntityTypeBold", None),
+            (5, 4, "textEntityTypeItalic", None),
+            (10, 2, "textEntityTypeItalic", None),
+        ],
+    ),
+    ("<strong>s</strong><em>e</em>", "se", [(0, 1, "textEntityTypeBold", None), (1, 1, "textEntityTypeItalic", None)]),
+    ("<B>caps</B>", "caps", [(0, 4, "textEntityTypeBold", None)]),
+    ("<code>abc-123</code>", "abc-123", [(0, 7, "textEntityTypeCode", None)]),
+    (
+        "<u>u</u><s>s</s><pre>p</pre>",
+        "usp",
+        [
+            (0, 1, "textEntityTypeUnderline", None),
+            (1, 1, "textEntityTypeStrikethrough", None),
+            (2, 1, "textEntityTypePre", None),
+        ],
+    ),
+    (
+        '<a href="https://example.com/x?a=1&amp;b=2">link</a>',
+        "link",
+        [(0, 4, "textEntityTypeTextUrl", "https://example.com/x?a=1&b=2")],
+    ),
+    ("é😀<i>z</i>", "é😀z", [(3, 1, "textEntityTypeItalic", None)]),
+    ("😀😀<b>👍🏽</b>!", "😀😀👍🏽!", [(4, 4, "textEntityTypeBold", None)]),
+    ("&lt;Live&gt; &quot;x&quot; &#39;y&#x27;", "<Live> \"x\" 'y'", []),
+    ("Tom & Jerry", "Tom & Jerry", []),
+    ("<b></b>x", "x", []),
+    ("line1\n<i>line2</i>", "line1\nline2", [(6, 5, "textEntityTypeItalic", None)]),
+    (
+        f"<b>{html.escape('name <Live> & co')}</b>",
+        "name <Live> & co",
+        [(0, 16, "textEntityTypeBold", None)],
+    ),
+]
+
+# TDLib rejects these with "Unsupported start tag" / "Can't find end tag";
+# we send them as plain text without the formatting tags instead.
+TDLIB_ERRORS = [
+    ("Tom & Jerry <3", "Tom & Jerry <3"),
+    ("<b>open", "open"),
+    ("<b>🎧 Track:</b> <b>name <Live></b>", "🎧 Track: name <Live>"),
+    ("<i>a</b>", "a"),
+]
+
+
+def _entities(formatted):
+    return [
+        (entity.offset, entity.length, entity.type.getType(), getattr(entity.type, "url", None))
+        for entity in formatted.entities
+    ]
+
+
+@pytest.mark.parametrize("source, text, entities", TDLIB_PARITY)
+def test_matches_tdlib_parse(source, text, entities):
+    formatted = format_html(source)
+    assert formatted.text == text
+    assert _entities(formatted) == entities
+
+
+@pytest.mark.parametrize("source, text", TDLIB_ERRORS)
+def test_invalid_markup_falls_back_to_plain_text(source, text):
+    formatted = format_html(source)
+    assert formatted.text == text
+    assert formatted.entities == []
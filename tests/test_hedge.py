@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from src.utils._hedge import MIN_SAMPLES, Hedger
+
+
+def _warm(hedger: Hedger, latency: float = 0.01) -> None:
+    hedger._latencies.extend([latency] * MIN_SAMPLES)
+
+
+def test_fast_primary_returns_its_result_after_warm_up():
+    hedger = Hedger(percentile=95, budget=1.0)
+
+    async def fast():
+        return "data"
+
+    async def main():
+        return [await hedger.run(fast) for _ in range(MIN_SAMPLES * 2)]
+
+    assert asyncio.run(main()) == ["data"] * (MIN_SAMPLES * 2)
+    assert hedger.delay() is not None
+    assert hedger.hedged == 0
+
+
+def test_slow_primary_is_hedged_and_hedge_wins():
+    hedger = Hedger(percentile=95, budget=1.0)
+    _warm(hedger)
+    calls = 0
+
+    async def func():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            await asyncio.sleep(5)
+            return "primary"
+        return "hedge"
+
+    assert asyncio.run(hedger.run(func)) == "hedge"
+    assert calls == 2
+    assert hedger.hedged == 1
+    assert hedger.hedge_wins == 1
+
+
+def test_fast_primary_exception_propagates():
+    hedger = Hedger(percentile=95, budget=1.0)
+    _warm(hedger)
+
+    async def boom():
+        raise ValueError("upstream broke")
+
+    with pytest.raises(ValueError, match="upstream broke"):
+        asyncio.run(hedger.run(boom))
+    assert hedger.hedged == 0
+
+
+def test_slow_primary_exception_falls_back_to_hedge():
+    hedger = Hedger(percentile=95, budget=1.0)
+    _warm(hedger)
+    calls = 0
+
+    async def func():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            await asyncio.sleep(0.2)
+            raise ValueError("primary failed")
+        await asyncio.sleep(0.3)
+        return "hedge"
+
+    assert asyncio.run(hedger.run(func)) == "hedge"
+
+
+def test_unaccepted_results_return_the_last_answer():
+    hedger = Hedger(percentile=95, budget=1.0)
+    _warm(hedger)
+
+    async def func():
+        await asyncio.sleep(0.1)
+        return "error"
+
+    assert asyncio.run(hedger.run(func, accept=lambda result: False)) == "error"
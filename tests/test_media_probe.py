@@ -0,0 +1,104 @@
+import asyncio
+import struct
+
+import httpx
+import pytest
+
+from src.utils import _media_probe
+from src.utils._http import HttpClient
+from src.utils._media_probe import MediaProbe, canonical_media_url
+
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def _mp4(handlers, faststart=True) -> bytes:
+    traks = b"".join(
+        _box(b"trak", _box(b"mdia", _box(b"hdlr", b"\0" * 8 + handler + b"\0" * 12))) for handler in handlers
+    )
+    ftyp, moov, mdat = _box(b"ftyp", b"isom\0\0\0\0isom"), _box(b"moov", traks), _box(b"mdat", b"\0" * 100_000)
+    return ftyp + moov + mdat if faststart else ftyp + mdat + moov
+
+
+class _FakeProcess:
+    def __init__(self, returncode: int, stdout: bytes, stderr: bytes):
+        self.returncode = returncode
+        self._output = stdout, stderr
+
+    async def communicate(self):
+        return self._output
+
+    def kill(self):
+        pass
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """Serve `files` by path with Range support; return the requested paths."""
+    requests = []
+
+    def install(files, ffprobe=(0, b"", b"")):
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests.append(request.url.path)
+            body = files.get(request.url.path)
+            if body is None:
+                return httpx.Response(403)
+            start, end = request.headers["range"][6:].split("-")
+            return httpx.Response(206, content=body[int(start):int(end) + 1])
+
+        async def fake_exec(*cmd, **kwargs):
+            requests.append("ffprobe")
+            return _FakeProcess(*ffprobe)
+
+        monkeypatch.setitem(HttpClient._clients, "probe", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        monkeypatch.setattr(_media_probe.asyncio, "create_subprocess_exec", fake_exec)
+        return requests
+
+    return install
+
+
+@pytest.mark.parametrize("faststart", [True, False])
+def test_mp4_audio_is_read_from_the_box_index(serve, faststart):
+    requests = serve({"/a.mp4": _mp4([b"vide", b"soun"], faststart), "/n.mp4": _mp4([b"vide"], faststart)})
+    probe = MediaProbe(2)
+
+    async def main():
+        return await probe.has_audio("https://cdn/a.mp4"), await probe.has_audio("https://cdn/n.mp4")
+
+    assert asyncio.run(main()) == (True, False)
+    assert "ffprobe" not in requests
+
+
+def test_resigned_url_hits_the_cache(serve):
+    requests = serve({"/a.mp4": _mp4([b"vide", b"soun"])})
+    probe = MediaProbe(2)
+
+    async def main():
+        await probe.has_audio("https://cdn/a.mp4?oe=1&_nc_sid=2")
+        return await probe.has_audio("https://cdn/a.mp4?oe=3&_nc_sid=4")
+
+    assert asyncio.run(main()) is True
+    assert requests == ["/a.mp4"]
+
+
+def test_unreadable_url_is_not_cached_as_silent(serve):
+    requests = serve({}, ffprobe=(1, b"", b"Server returned 403 Forbidden"))
+    probe = MediaProbe(2)
+
+    async def main():
+        return await probe.has_audio("https://cdn/v.mp4?oe=1"), await probe.has_audio("https://cdn/v.mp4?oe=2")
+
+    assert asyncio.run(main()) == (True, True)
+    assert requests.count("ffprobe") == 2
+    assert probe.failures == 2
+
+
+def test_ffprobe_clean_empty_output_means_no_audio(serve):
+    serve({}, ffprobe=(0, b"", b""))
+    probe = MediaProbe(2)
+    assert asyncio.run(probe.has_audio("https://cdn/v.webm")) is False
+
+
+def test_canonical_url_drops_only_signature_params():
+    assert canonical_media_url("https://CDN.example/v.mp4?_nc_ht=x&oh=1&oe=2&id=5&b=1") == "https://cdn.example/v.mp4?b=1&id=5"
@@ -0,0 +1,131 @@
+import os
+import struct
+
+import pytest
+
+from src.utils._ogg import PAGE_HEADER, _parse_comments, ogg_crc, write_tagged_ogg
+
+SERIAL = 0x1234
+IDENT = b"\x01vorbis" + bytes(range(23))
+SETUP = b"\x05vorbis" + os.urandom(3000)
+
+
+def _crc_reference(data: bytes) -> int:
+    crc = 0
+    for byte in data:
+        crc ^= byte << 24
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04C11DB7) if crc & 0x80000000 else crc << 1
+            crc &= 0xFFFFFFFF
+    return crc
+
+
+def _comment(vendor: str, comments) -> bytes:
+    parts = [b"\x03vorbis", struct.pack("<I", len(vendor)), vendor.encode()]
+    parts.append(struct.pack("<I", len(comments)))
+    for comment in comments:
+        parts += [struct.pack("<I", len(comment.encode())), comment.encode()]
+    return b"".join(parts) + b"\x01"
+
+
+def _page(flags: int, granule: int, seq: int, lacing: bytes, body: bytes) -> bytes:
+    page = PAGE_HEADER.pack(b"OggS", 0, flags, granule, SERIAL, seq, 0, len(lacing)) + lacing + body
+    return page[:22] + struct.pack("<I", _crc_reference(page)) + page[26:]
+
+
+def _lay_out(packets, granule: int, seq: int, flags: int = 0):
+    """Pack `packets` into as many pages as their lacing needs, as an encoder would."""
+    segments = []
+    for packet in packets:
+        lacing = [255] * (len(packet) // 255) + [len(packet) % 255]
+        segments += [(value, i == len(lacing) - 1) for i, value in enumerate(lacing)]
+    payload, offset, pages, continued = b"".join(packets), 0, [], False
+    for start in range(0, len(segments), 255):
+        chunk = segments[start:start + 255]
+        size = sum(value for value, _ in chunk)
+        ends = any(end for _, end in chunk)
+        page_flags = flags | (0x01 if continued else 0)
+        pages.append(_page(page_flags, granule if ends else -1, seq, bytes(v for v, _ in chunk), payload[offset:offset + size]))
+        offset, seq, continued, flags = offset + size, seq + 1, not chunk[-1][1], 0
+    return pages
+
+
+def _read(data: bytes):
+    """Return (pages, packets) of an Ogg stream, checking every page's CRC."""
+    pages, packets, partial, pos = [], [], b"", 0
+    while pos < len(data):
+        capture, _, flags, granule, serial, seq, crc, count = PAGE_HEADER.unpack_from(data, pos)
+        assert capture == b"OggS"
+        lacing = data[pos + PAGE_HEADER.size:pos + PAGE_HEADER.size + count]
+        end = pos + PAGE_HEADER.size + count + sum(lacing)
+        page = data[pos:end]
+        assert crc == _crc_reference(page[:22] + b"\0\0\0\0" + page[26:])
+        pages.append((flags, granule, serial, seq))
+
+        body_pos = pos + PAGE_HEADER.size + count
+        for value in lacing:
+            partial += data[body_pos:body_pos + value]
+            body_pos += value
+            if value < 255:
+                packets.append(partial)
+                partial = b""
+        pos = end
+    return pages, packets
+
+
+def _rewrite(tmp_path, stream: bytes, tags):
+    src, dst = tmp_path / "in.ogg", tmp_path / "out.ogg"
+    src.write_bytes(stream)
+    write_tagged_ogg(src, dst, tags, patch_spotify=False)
+    return _read(dst.read_bytes())
+
+
+def _check_pages(pages) -> None:
+    assert [seq for _, _, _, seq in pages] == list(range(len(pages)))
+    assert {serial for _, _, serial, _ in pages} == {SERIAL}
+    assert pages[0][0] & 0x02
+    assert pages[-1][0] & 0x04
+    assert not any(flags & 0x04 for flags, _, _, _ in pages[:-1])
+
+
+@pytest.mark.parametrize("data", [b"", b"OggS", bytes(range(256)) * 3, os.urandom(4096)])
+def test_crc_matches_bitwise_reference(data):
+    assert ogg_crc(data) == _crc_reference(data)
+
+
+def test_long_comment_packet_round_trips(tmp_path):
+    long_comment = "LYRICS=" + "la " * 40_000  # well past 255 lacing segments
+    audio = [os.urandom(700), os.urandom(90), os.urandom(255)]
+    stream = b"".join([
+        *_lay_out([IDENT], 0, 0, flags=0x02),
+        *_lay_out([_comment("enc", ["TITLE=old", long_comment]), SETUP], 0, 1),
+    ])
+    seq = len(_read(stream)[0])
+    for i, packet in enumerate(audio):
+        stream += b"".join(_lay_out([packet], 1000 * (i + 1), seq))
+        seq += 1
+
+    pages, packets = _rewrite(tmp_path, stream, [("title", "New"), ("artist", "Someone")])
+
+    _check_pages(pages)
+    assert packets[0] == IDENT
+    assert _parse_comments(packets[1]) == ("enc", [long_comment, "TITLE=New", "ARTIST=Someone"])
+    assert packets[2] == SETUP
+    assert packets[3:] == audio
+    assert pages[-1][1] == 3000
+
+
+def test_audio_sharing_the_setup_page_is_kept(tmp_path):
+    audio = [os.urandom(40), os.urandom(300), os.urandom(120)]
+    stream = b"".join([
+        *_lay_out([IDENT], 0, 0, flags=0x02),
+        *_lay_out([_comment("enc", []), SETUP[:200], audio[0], audio[1]], 500, 1),
+        *_lay_out([audio[2]], 900, 2),
+    ])
+
+    pages, packets = _rewrite(tmp_path, stream, [("album", "Record")])
+
+    _check_pages(pages)
+    assert packets == [IDENT, _comment("enc", ["ALBUM=Record"]), SETUP[:200], *audio]
+    # The audio split off the setup page keeps that page's granule.
+    assert [granule for _, granule, _, _ in pages[-2:]] == [500, 900]
@@ -0,0 +1,76 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from src.utils import _ranged
+from src.utils._downloader import Download
+from src.utils._ranged import DownloadStatusError, _segment_bounds, download_to_file
+
+KEY = "00112233445566778899aabbccddeeff"
+
+
+def _server(body: bytes, ranges: bool = True, range_status: int = 206):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        header = request.headers.get("range")
+        requests.append(header)
+        if header is None:
+            headers = {"Content-Length": str(len(body))}
+            if ranges:
+                headers["Accept-Ranges"] = "bytes"
+            return httpx.Response(200, content=body, headers=headers)
+        start, end = (int(n) for n in header[6:].split("-"))
+        return httpx.Response(range_status, content=body[start:end + 1])
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler)), requests
+
+
+def _decrypt(offset: int):
+    return Download._new_cipher(KEY, offset).decrypt
+
+
+@pytest.fixture(autouse=True)
+def small_segments(monkeypatch):
+    monkeypatch.setattr(_ranged, "MIN_SEGMENTED_SIZE", 1024)
+
+
+@pytest.mark.parametrize("size, parts", [(100_003, 4), (4096, 3), (65_536, 7)])
+def test_segments_are_aligned_and_cover_the_file(size, parts):
+    bounds = _segment_bounds(size, parts)
+    assert bounds[0][0] == 0 and bounds[-1][1] == size - 1
+    assert all(start % 16 == 0 for start, _ in bounds)
+    assert all(bounds[i][1] + 1 == bounds[i + 1][0] for i in range(len(bounds) - 1))
+
+
+def test_segmented_download_decrypts_every_segment_at_its_offset(tmp_path):
+    plain = os.urandom(100_003)
+    encrypted = Download._new_cipher(KEY).encrypt(plain)
+    client, requests = _server(encrypted)
+    path = tmp_path / "out"
+
+    asyncio.run(download_to_file(client, "https://cdn.test/track", path, _decrypt, parts=4))
+
+    assert path.read_bytes() == plain
+    assert requests[0] is None and len(requests) == 4
+
+
+def test_server_without_ranges_gets_one_stream(tmp_path):
+    plain = os.urandom(50_000)
+    client, requests = _server(Download._new_cipher(KEY).encrypt(plain), ranges=False)
+    path = tmp_path / "out"
+
+    headers = asyncio.run(download_to_file(client, "https://cdn.test/track", path, _decrypt, parts=4))
+
+    assert path.read_bytes() == plain
+    assert requests == [None]
+    assert headers["Content-Length"] == "50000"
+
+
+def test_range_ignored_by_the_server_fails_the_download(tmp_path):
+    client, _ = _server(os.urandom(50_000), range_status=200)
+
+    with pytest.raises(DownloadStatusError):
+        asyncio.run(download_to_file(client, "https://cdn.test/track", tmp_path / "out", parts=4))
@@ -0,0 +1,30 @@
+from src.utils import _remote_urls
+from src.utils._remote_urls import HALF_LIFE, RemoteURLTracker
+
+
+def test_hosts_are_scored_by_full_hostname():
+    assert RemoteURLTracker.host_of("https://a.bbc.co.uk/x.mp4") == "a.bbc.co.uk"
+    assert RemoteURLTracker.host_of("http://10.0.0.5:8080/v.mp4") == "10.0.0.5"
+    assert RemoteURLTracker.host_of("AgACAgQAAxkBAAIB") is None
+
+
+def test_failing_host_goes_local_without_affecting_neighbours(monkeypatch):
+    monkeypatch.setattr(_remote_urls.random, "random", lambda: 1.0)  # never explore
+    tracker = RemoteURLTracker()
+    for _ in range(6):
+        tracker.record("https://bad.cdn.co.uk/v.mp4", False)
+
+    assert not tracker.should_try_remote("https://bad.cdn.co.uk/w.mp4")
+    assert tracker.should_try_remote("https://good.cdn.co.uk/w.mp4")
+    assert tracker.should_try_remote("AgACAgQAAxkBAAIB")
+
+
+def test_failures_decay_so_the_host_is_retried(monkeypatch):
+    monkeypatch.setattr(_remote_urls.random, "random", lambda: 1.0)
+    tracker = RemoteURLTracker()
+    for _ in range(6):
+        tracker.record("https://bad.example/v.mp4", False)
+    assert not tracker.should_try_remote("https://bad.example/v.mp4")
+
+    tracker._hosts["bad.example"].updated -= 3 * HALF_LIFE
+    assert tracker.should_try_remote("https://bad.example/v.mp4")
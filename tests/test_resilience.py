@@ -0,0 +1,115 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.utils import _resilience
+from src.utils._resilience import (
+    STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, CircuitBreaker, CircuitOpenError, Resilience, is_transient,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(_resilience.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _open(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.threshold):
+        breaker.before_request()
+        breaker.record_failure()
+
+
+def test_breaker_opens_after_threshold_and_rejects(clock):
+    breaker = CircuitBreaker("api.test", threshold=3, reset_after=10)
+    _open(breaker)
+
+    assert breaker.state == STATE_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    assert breaker.rejected == 1
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker("api.test", threshold=3, reset_after=10)
+    _open(breaker)
+    clock[0] += 10
+
+    breaker.before_request()
+    assert breaker.state == STATE_HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()  # a second caller waits for the probe
+
+    breaker.record_success()
+    assert breaker.state == STATE_CLOSED
+    breaker.before_request()
+
+
+def test_failed_probe_reopens_for_a_full_period(clock):
+    breaker = CircuitBreaker("api.test", threshold=3, reset_after=10)
+    _open(breaker)
+    clock[0] += 10
+    breaker.before_request()
+    breaker.record_failure()
+
+    assert breaker.state == STATE_OPEN
+    clock[0] += 5
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    assert breaker.times_opened == 2
+
+
+def test_released_probe_lets_the_next_caller_try(clock):
+    breaker = CircuitBreaker("api.test", threshold=3, reset_after=10)
+    _open(breaker)
+    clock[0] += 10
+    breaker.before_request()
+    breaker.release_probe()
+
+    breaker.before_request()
+    assert breaker.state == STATE_HALF_OPEN
+
+
+def test_transient_classification():
+    request = httpx.Request("GET", "https://api.test")
+    assert is_transient(httpx.ConnectError("down", request=request))
+    assert is_transient(httpx.HTTPStatusError("busy", request=request, response=httpx.Response(503)))
+    assert not is_transient(httpx.HTTPStatusError("gone", request=request, response=httpx.Response(404)))
+    assert not is_transient(httpx.PoolTimeout("local"))
+    assert not is_transient(CircuitOpenError("api.test", 1))
+
+
+def test_call_retries_transient_failures(monkeypatch):
+    monkeypatch.setattr(Resilience, "backoff", staticmethod(lambda attempt: 0))
+    resilience = Resilience(attempts=3)
+    calls = 0
+
+    async def flaky():
+        nonlocal calls
+        calls += 1
+        if calls < 3:
+            raise httpx.ConnectError("down")
+        return "ok"
+
+    assert asyncio.run(resilience.call("https://api.test/x", flaky)) == "ok"
+    assert calls == 3
+    assert resilience.breaker("https://api.test/y").stats()["retries"] == 2
+    assert resilience.breaker("https://api.test/y").state == STATE_CLOSED
+
+
+def test_call_does_not_retry_a_bad_request(monkeypatch):
+    monkeypatch.setattr(Resilience, "backoff", staticmethod(lambda attempt: 0))
+    resilience = Resilience(attempts=3)
+    calls = 0
+
+    async def bad():
+        nonlocal calls
+        calls += 1
+        raise ValueError("bad input")
+
+    with pytest.raises(ValueError):
+        asyncio.run(resilience.call("https://api.test/x", bad))
+    assert calls == 1
+    assert resilience.breaker("https://api.test").failures == 0
@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from src.utils._scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, DownloadScheduler, PrioritySlots
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_slots_bound_concurrency():
+    slots = PrioritySlots(2)
+    running = peak = 0
+
+    async def job():
+        nonlocal running, peak
+        await slots.acquire(PRIORITY_BULK)
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        slots.release()
+
+    async def main():
+        await asyncio.gather(*(job() for _ in range(6)))
+
+    asyncio.run(main())
+    assert peak == 2
+    assert slots.active == 0
+
+
+def test_interactive_waiters_go_first_and_equal_priorities_keep_order():
+    slots = PrioritySlots(1)
+    order = []
+
+    async def job(name, priority):
+        await slots.acquire(priority)
+        order.append(name)
+        slots.release()
+
+    async def main():
+        await slots.acquire(PRIORITY_BULK)
+        jobs = []
+        for name, priority in [("bulk1", PRIORITY_BULK), ("bulk2", PRIORITY_BULK),
+                               ("fast1", PRIORITY_INTERACTIVE), ("fast2", PRIORITY_INTERACTIVE)]:
+            jobs.append(asyncio.create_task(job(name, priority)))
+            await _settle()
+        assert slots.queued == {PRIORITY_INTERACTIVE: 2, PRIORITY_BULK: 2}
+        slots.release()
+        await asyncio.gather(*jobs)
+
+    asyncio.run(main())
+    assert order == ["fast1", "fast2", "bulk1", "bulk2"]
+    assert slots.active == 0
+
+
+def test_new_arrivals_queue_behind_waiters():
+    slots = PrioritySlots(1)
+    order = []
+
+    async def job(name):
+        await slots.acquire(PRIORITY_BULK)
+        order.append(name)
+        await asyncio.sleep(0)
+        slots.release()
+
+    async def main():
+        await slots.acquire(PRIORITY_BULK)
+        first = asyncio.create_task(job("waiting"))
+        await _settle()
+        slots.release()
+        # The freed slot already belongs to the waiter; a newcomer cannot take it.
+        await job("newcomer")
+        await first
+
+    asyncio.run(main())
+    assert order == ["waiting", "newcomer"]
+
+
+def test_cancelled_waiter_does_not_keep_a_slot():
+    slots = PrioritySlots(1)
+
+    async def main():
+        await slots.acquire(PRIORITY_BULK)
+        waiter = asyncio.create_task(slots.acquire(PRIORITY_BULK))
+        await _settle()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert slots.queued_total() == 0
+        slots.release()
+        assert slots.active == 0
+        await asyncio.wait_for(slots.acquire(PRIORITY_BULK), 1)
+
+    asyncio.run(main())
+    assert slots.active == 1
+
+
+def test_waiter_cancelled_after_handover_passes_the_slot_on():
+    slots = PrioritySlots(1)
+
+    async def main():
+        await slots.acquire(PRIORITY_BULK)
+        first = asyncio.create_task(slots.acquire(PRIORITY_BULK))
+        second = asyncio.create_task(slots.acquire(PRIORITY_BULK))
+        await _settle()
+        slots.release()  # hands the slot to `first`...
+        first.cancel()  # ...which is cancelled before it runs
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await asyncio.wait_for(second, 1)
+
+    asyncio.run(main())
+    assert slots.active == 1
+    assert slots.queued_total() == 0
+
+
+def test_scheduler_keeps_platforms_apart():
+    scheduler = DownloadScheduler(1)
+
+    async def main():
+        async with scheduler.slot("spotify"):
+            # Another platform is not blocked by a busy one.
+            async with scheduler.slot("deezer", PRIORITY_BULK):
+                pass
+
+    asyncio.run(main())
+    stats = scheduler.stats()
+    assert stats["spotify"]["completed"] == 1
+    assert stats["deezer"]["active"] == "0/1"
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from src.utils._singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+
+    assert asyncio.run(main()) == [1] * 5
+    assert calls == 1
+    assert flight.stats() == {"inflight": 0, "started": 1, "shared": 4}
+
+
+def test_errors_reach_every_caller_and_free_the_key():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+        return results, flight.running("key")
+
+    results, running = asyncio.run(main())
+    assert [type(r) for r in results] == [ValueError, ValueError]
+    assert not running
+
+
+def test_cancelled_caller_leaves_the_work_for_the_others():
+    flight = SingleFlight(cancel_orphans=True)
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        first = asyncio.create_task(flight.do("key", work))
+        second = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"
+    assert flight.abandoned == 0
+
+
+def test_work_is_cancelled_once_every_caller_is():
+    flight = SingleFlight(cancel_orphans=True)
+    finished = False
+
+    async def work():
+        nonlocal finished
+        await asyncio.sleep(0.05)
+        finished = True
+
+    async def main():
+        callers = [asyncio.create_task(flight.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0.1)
+        return flight.running("key")
+
+    assert asyncio.run(main()) is False
+    assert not finished
+    assert flight.abandoned == 1
+
+
+def test_without_cancel_orphans_the_work_finishes():
+    flight = SingleFlight()
+    finished = False
+
+    async def work():
+        nonlocal finished
+        await asyncio.sleep(0.05)
+        finished = True
+
+    async def main():
+        caller = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    assert finished
+
+
+def test_started_work_survives_its_callers():
+    flight = SingleFlight(cancel_orphans=True)
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "prefetched"
+
+    async def main():
+        task = flight.start("key", work)
+        caller = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        return await task
+
+    assert asyncio.run(main()) == "prefetched"
+    assert flight.abandoned == 0